@@ -0,0 +1,196 @@
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from tennis_game import DEFAULT_CONFIG
+from headless import BotController, HeadlessKeys
+
+# Ticks of lookahead, and how many top/bottom bounces one prediction follows
+HORIZON = 400
+MAX_BOUNCES = 6
+
+STEPS = np.arange(1, HORIZON + 1, dtype=float)
+
+@lru_cache(maxsize=None)
+def rollout_tables(gravity, drag):
+    # Closed forms of Ball.update between two bounces, for k = 1..HORIZON ticks:
+    #   x_k = x + dx * (1 - drag^k) / (1 - drag)
+    #   y_k = y + dy * k + gravity * k * (k - 1) / 2
+    drag_powers = drag ** STEPS
+    if drag == 1:
+        drag_sums = STEPS
+    else:
+        drag_sums = (1 - drag_powers) / (1 - drag)
+    gravity_sums = gravity * STEPS * (STEPS - 1) / 2
+    return drag_powers, drag_sums, gravity_sums
+
+# delay: ticks before reacting to a new shot, aim_error: spread of the aim
+# point in pixels, reaction: chance of acting on a tick, swing: chance a swing is timed
+Difficulty = namedtuple("Difficulty", ["delay", "aim_error", "reaction", "swing"])
+DIFFICULTIES = {
+    "easy": Difficulty(delay=20, aim_error=30.0, reaction=0.75, swing=0.7),
+    "medium": Difficulty(delay=8, aim_error=12.0, reaction=0.9, swing=0.85),
+    "hard": Difficulty(delay=2, aim_error=3.0, reaction=0.98, swing=0.95)
+}
+
+def predict_crossings(x, y, dx, dy, target_x, config=DEFAULT_CONFIG):
+    # For every ball, the tick count and y at which it first reaches target_x,
+    # following top/bottom bounces; NaN where it goes out or runs past the
+    # horizon first. Each bounce-free stretch is one (balls, HORIZON) rollout,
+    # so the cost is bounded by MAX_BOUNCES + 1 array passes.
+    x = np.array(x, dtype=float, ndmin=1)
+    y = np.array(y, dtype=float, ndmin=1)
+    dx = np.array(dx, dtype=float, ndmin=1)
+    dy = np.array(dy, dtype=float, ndmin=1)
+    target_x = np.broadcast_to(np.asarray(target_x, dtype=float), x.shape)
+    elapsed = np.zeros(x.shape, dtype=np.int64)
+    ticks = np.full(x.shape, np.nan)
+    cross_y = np.full(x.shape, np.nan)
+    live = np.flatnonzero((target_x - x) * dx > 0)
+    gravity = config.gravity
+    drag_powers, drag_sums, gravity_sums = rollout_tables(gravity, config.air_resistance)
+
+    for _ in range(MAX_BOUNCES + 1):
+        if not len(live):
+            break
+        lx, ly, ldx, ldy = x[live, None], y[live, None], dx[live, None], dy[live, None]
+        xs = lx + ldx * drag_sums
+        ys = ly + ldy * STEPS + gravity_sums
+        vy = ldy + gravity * STEPS  # dy after the gravity step, before the wall check
+        crossed = (xs - target_x[live, None]) * ldx >= 0
+        out = (xs <= config.court_x) | (xs >= config.court_right)
+        bounce = (((ys <= config.court_y) & (vy < 0)) | ((ys >= config.court_bottom) & (vy > 0)))
+        # Ticks left before the horizon; anything later counts as never
+        remaining = HORIZON - elapsed[live, None]
+        in_time = STEPS <= remaining
+
+        first_cross = first_index(crossed & in_time)
+        first_out = first_index(out & in_time)
+        first_bounce = first_index(bounce & in_time)
+
+        hit = (first_cross <= first_out) & (first_cross <= first_bounce) & (first_cross < HORIZON)
+        rows = np.flatnonzero(hit)
+        if len(rows):
+            lanes = live[rows]
+            k = first_cross[rows]
+            ticks[lanes] = elapsed[lanes] + k + 1
+            cross_y[lanes] = ys[rows, k]
+
+        # Bounces restart the rollout from the bounce tick
+        bounced = ~hit & (first_bounce < first_out) & (first_bounce < HORIZON)
+        rows = np.flatnonzero(bounced)
+        lanes = live[rows]
+        k = first_bounce[rows]
+        x[lanes] = xs[rows, k]
+        y[lanes] = ys[rows, k]
+        dx[lanes] = dx[lanes] * drag_powers[k]
+        dy[lanes] = np.where(y[lanes] <= config.court_y, 1, -1) * np.abs(vy[rows, k])
+        elapsed[lanes] += k + 1
+        live = lanes
+    return ticks, cross_y
+
+def first_index(mask):
+    # Index of the first True in each row, HORIZON where there is none
+    return np.where(mask.any(axis=1), mask.argmax(axis=1), HORIZON)
+
+class AIController(BotController):
+    # BotController with lookahead: instead of following the ball's current
+    # height it heads for where the ball will cross its hitting line.
+    # Predictions are exact, so a new one is only needed after a hit or a
+    # serve changed the ball's course.
+    def __init__(self, player, rng, difficulty="medium"):
+        self.difficulty = DIFFICULTIES[difficulty]
+        super().__init__(player, rng, self.difficulty.swing)
+        self.config = player.config
+        self.target_y = self.config.court_y + self.config.court_height / 2
+        self.last_dx = None
+        self.plan_in = 0
+
+    def watch(self, ball):
+        # Between shots dx only ever decays by the air resistance, anything
+        # else is a new shot
+        if self.last_dx is None or ball.dx != self.last_dx * self.config.air_resistance:
+            self.plan_in = self.difficulty.delay
+        self.last_dx = ball.dx
+        if self.plan_in:
+            self.plan_in -= 1
+            if not self.plan_in:
+                self.plan(ball)
+
+    def plan(self, ball):
+        if (ball.dx < 0) != self.player.is_player1:
+            # Nothing coming: wait in the middle of the court
+            self.target_y = self.config.court_y + self.config.court_height / 2
+            return
+        player = self.player
+        _, cross_y = predict_crossings(ball.x, ball.y, ball.dx, ball.dy, player.x + player.width / 2,
+                                       self.config)
+        if np.isnan(cross_y[0]):
+            self.target_y = ball.y
+        else:
+            self.target_y = cross_y[0] + self.rng.gauss(0, self.difficulty.aim_error)
+
+    def press(self, keys, ball):
+        self.watch(ball)
+        if self.rng.random() > self.difficulty.reaction:
+            return
+
+        player = self.player
+        center_y = player.y + player.height // 2
+        if self.target_y < center_y - player.speed:
+            keys.pressed.add(self.up)
+        elif self.target_y > center_y + player.speed:
+            keys.pressed.add(self.down)
+
+        target_x = self.home_x
+        if abs(ball.dx) < 1 and self.in_own_half(ball):
+            target_x = ball.x - player.width // 2
+        if target_x < player.x - player.speed:
+            keys.pressed.add(self.left)
+        elif target_x > player.x + player.speed:
+            keys.pressed.add(self.right)
+
+class AssistedKeys(HeadlessKeys):
+    # Keyboard state plus the keys an AIController pressed this tick
+    def __init__(self):
+        super().__init__()
+        self.base = None
+
+    def __getitem__(self, key):
+        return key in self.pressed or bool(self.base[key])
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    import random
+
+    from tennis_game import Ball, COURT_X, COURT_Y, COURT_WIDTH
+
+    # Prediction check against stepping Ball.update, then rollout throughput
+    rng = random.Random(0)
+    errors = []
+    for _ in range(200):
+        ball = Ball(rng.uniform(COURT_X + 300, COURT_X + 500), rng.uniform(COURT_Y + 50, COURT_Y + 350), rng)
+        ball.dx *= rng.uniform(0.5, 2.0)
+        ball.dy *= rng.uniform(0.5, 3.0)
+        target = COURT_X + 60 if ball.dx < 0 else COURT_X + COURT_WIDTH - 60
+        ticks, cross_y = predict_crossings(ball.x, ball.y, ball.dx, ball.dy, target)
+        for tick in range(1, HORIZON + 1):
+            ball.update()
+            if (ball.x - target) * ball.dx >= 0 or not COURT_X < ball.x < COURT_X + COURT_WIDTH:
+                break
+        if not np.isnan(ticks[0]):
+            errors.append((abs(ticks[0] - tick), abs(cross_y[0] - ball.y)))
+    errors = np.array(errors)
+    print(f"{len(errors)} crossings predicted, max tick error {errors[:, 0].max():.0f}, "
+          f"max y error {errors[:, 1].max():.3f}px")
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    start = time.perf_counter()
+    predict_crossings(np.full(count, COURT_X + 400.0), np.full(count, COURT_Y + 200.0),
+                      np.random.uniform(-6, 6, count), np.random.uniform(-4, 4, count),
+                      np.full(count, COURT_X + 60.0))
+    elapsed = time.perf_counter() - start
+    print(f"{count} predictions in {elapsed * 1000:.1f}ms ({count / elapsed:.0f}/s)")
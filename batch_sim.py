@@ -0,0 +1,251 @@
+import numpy as np
+
+from tennis_game import DEFAULT_CONFIG
+from headless import MAX_TICKS, SWING_COOLDOWN
+from score_table import score_table, START
+from ai import DIFFICULTIES, predict_crossings
+
+# Mirrors Ball and Player so every lane behaves like one TennisMatch
+BALL_RADIUS = 8
+TRAIL_LENGTH = 10
+PLAYER_WIDTH = 20
+PLAYER_HEIGHT = 40
+
+class BatchSimulator:
+    # Runs N bot-vs-bot matches in lockstep, one vectorized step per tick.
+    # Ball, players and the packed score all live in structure-of-arrays
+    # form, scoring goes through the precomputed ScoreTable transitions.
+    def __init__(self, n, seed=None, reaction=0.9, difficulty=None, config=DEFAULT_CONFIG):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.config = config
+        self.speed = config.player_speed
+        # With a difficulty both sides play as ai.AIController instead
+        self.difficulty = None if difficulty is None else DIFFICULTIES[difficulty]
+        self.press_chance = reaction if difficulty is None else self.difficulty.reaction
+        self.swing_chance = reaction if difficulty is None else self.difficulty.swing
+
+        # Ball state
+        self.x = np.full(n, float(config.center_x))
+        self.y = np.full(n, float(config.center_y))
+        self.dx = np.empty(n)
+        self.dy = np.empty(n)
+        self.prev_x = np.empty(n)
+        self.prev_y = np.empty(n)
+        self.trail = np.zeros((n, TRAIL_LENGTH, 2))
+        self.trail_len = np.zeros(n, dtype=np.int64)
+        self.trail_head = 0
+        self.serve(np.arange(n))
+
+        # Player state, index 0 is player 1 and index 1 is player 2
+        self.px = np.empty((2, n))
+        self.px[0] = config.court_x + 50
+        self.px[1] = config.court_right - 70
+        self.py = np.full((2, n), float(config.center_y))
+        self.home_x = self.px[:, :1].copy()
+        self.cooldown = np.zeros((2, n), dtype=np.int64)
+        self.target_y = np.full((2, n), config.court_y + config.court_height / 2)
+        self.last_dx = np.full(n, np.nan)
+        self.plan_in = np.zeros(n, dtype=np.int64)
+
+        self.score_table = score_table()
+        self.score_state = np.full(n, START, dtype=np.int32)
+        self.active = np.ones(n, dtype=bool)
+        self.points = np.zeros(n, dtype=np.int64)
+        self.hits = np.zeros(n, dtype=np.int64)
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.tick = 0
+
+        # Player movement limits, same as Player.update
+        self.min_x = np.array([[config.court_x], [config.center_x]])
+        self.max_x = np.array([[config.center_x - PLAYER_WIDTH],
+                               [config.court_right - PLAYER_WIDTH]])
+        # Racket sits on the baseline side of both players, as in Player.draw:
+        # left of player 1 and right of player 2
+        self.racket_offset = np.array([[-15], [PLAYER_WIDTH + 5]])
+
+    def serve(self, lanes):
+        # Equivalent of building a fresh Ball at the center of the screen
+        count = len(lanes)
+        self.x[lanes] = self.config.center_x
+        self.y[lanes] = self.config.center_y
+        self.prev_x[lanes] = self.x[lanes]
+        self.prev_y[lanes] = self.y[lanes]
+        self.dx[lanes] = self.rng.choice([-3.0, 3.0], count)
+        self.dy[lanes] = self.rng.choice([-2.0, 2.0], count)
+        self.trail_len[lanes] = 0
+
+    def swing(self):
+        # BotController.wants_hit for both players at once
+        in_p1_half = self.x < self.config.center_x
+        incoming = np.stack([in_p1_half | (self.dx < 0), ~in_p1_half | (self.dx > 0)])
+        reach = BALL_RADIUS + PLAYER_HEIGHT
+        close = ((np.abs(self.x - (self.px + PLAYER_WIDTH // 2)) < reach) &
+                 (np.abs(self.y - (self.py + PLAYER_HEIGHT // 2)) < reach))
+        waiting = self.cooldown > 0
+        self.cooldown[waiting] -= 1
+        attempt = ~waiting & incoming & close & self.active
+        self.cooldown[attempt] = SWING_COOLDOWN
+        return (attempt & (self.rng.random((2, self.n)) < self.swing_chance)).any(axis=0)
+
+    def sweep(self, lanes, left, top, right, bottom):
+        # collision.sweep for the given lanes: entry time of the ball's last
+        # move into each box grown by the radius, inf where it never touches
+        enter = np.zeros(left.shape)
+        leave = np.ones(left.shape)
+        for start, end, low, high in ((self.prev_x[lanes], self.x[lanes], left - BALL_RADIUS, right + BALL_RADIUS),
+                                      (self.prev_y[lanes], self.y[lanes], top - BALL_RADIUS, bottom + BALL_RADIUS)):
+            delta = end - start
+            moving = delta != 0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t0 = (low - start) / delta
+                t1 = (high - start) / delta
+            inside = (start > low) & (start < high)
+            np.maximum(enter, np.where(moving, np.minimum(t0, t1), np.where(inside, 0.0, np.inf)), out=enter)
+            np.minimum(leave, np.where(moving, np.maximum(t0, t1), np.inf), out=leave)
+        return np.where(enter < leave, enter, np.inf)
+
+    def hit(self, swinging):
+        # TennisMatch.hit_ball: earliest contact with either player's body or
+        # racket, player 1 winning ties. Only swinging lanes are tested.
+        lanes = np.flatnonzero(swinging)
+        px = self.px[:, lanes]
+        py = self.py[:, lanes]
+        racket_x = px + self.racket_offset - 3
+        racket_y = py + PLAYER_HEIGHT // 2 - 28
+        # Rows 0-1 are the bodies, rows 2-3 the rackets
+        times = self.sweep(lanes, np.concatenate((px, racket_x)), np.concatenate((py, racket_y)),
+                           np.concatenate((px + PLAYER_WIDTH, racket_x + 16)),
+                           np.concatenate((py + PLAYER_HEIGHT, racket_y + 43)))
+        contact = np.minimum(times[:2], times[2:])
+        touching = np.isfinite(contact)
+        p1 = touching[0] & (contact[0] <= contact[1])
+        p2 = ~p1 & touching[1]
+        spread_x = self.config.hit_spread_x
+        spread_y = self.config.hit_spread_y
+        for hit_lanes, sign in ((lanes[p1], 1), (lanes[p2], -1)):
+            if len(hit_lanes):
+                self.dx[hit_lanes] = (sign * np.abs(self.dx[hit_lanes]) +
+                                      self.rng.uniform(-spread_x, spread_x, len(hit_lanes)))
+                self.dy[hit_lanes] += self.rng.uniform(-spread_y, spread_y, len(hit_lanes))
+                self.hits[hit_lanes] += 1
+
+    def plan(self):
+        # AIController.watch and plan for every lane: a new prediction
+        # `delay` ticks after any hit or serve, for the player the ball heads to
+        changed = self.dx != self.last_dx * self.config.air_resistance
+        self.last_dx[:] = self.dx
+        self.plan_in[changed] = self.difficulty.delay
+        counting = self.plan_in > 0
+        self.plan_in[counting] -= 1
+        lanes = np.flatnonzero(counting & (self.plan_in == 0) & self.active)
+        if len(lanes):
+            toward = (self.dx[lanes] > 0).astype(np.int64)
+            _, cross_y = predict_crossings(self.x[lanes], self.y[lanes], self.dx[lanes], self.dy[lanes],
+                                           self.px[toward, lanes] + PLAYER_WIDTH / 2, self.config)
+            aim = cross_y + self.rng.normal(0, self.difficulty.aim_error, len(lanes))
+            self.target_y[:, lanes] = self.config.court_y + self.config.court_height / 2
+            self.target_y[toward, lanes] = np.where(np.isnan(cross_y), self.y[lanes], aim)
+        return self.target_y
+
+    def move_players(self):
+        # BotController.press (or AIController.press) followed by Player.update
+        target_y = self.y if self.difficulty is None else self.plan()
+        pressing = (self.rng.random((2, self.n)) <= self.press_chance) & self.active
+        speed = self.speed
+        config = self.config
+        center_y = self.py + PLAYER_HEIGHT // 2
+        up = pressing & (target_y < center_y - speed)
+        down = pressing & ~up & (target_y > center_y + speed)
+
+        in_p1_half = self.x < config.center_x
+        own_half = np.stack([in_p1_half, ~in_p1_half])
+        chase = own_half & (np.abs(self.dx) < 1)
+        target_x = np.where(chase, self.x - PLAYER_WIDTH // 2, self.home_x)
+        left = pressing & (target_x < self.px - speed)
+        right = pressing & ~left & (target_x > self.px + speed)
+
+        self.py -= speed * (up & (self.py > config.court_y))
+        self.py += speed * (down & (self.py < config.court_bottom - PLAYER_HEIGHT))
+        self.px -= speed * (left & (self.px > self.min_x))
+        self.px += speed * (right & (self.px < self.max_x))
+
+    def move_balls(self):
+        # Ball.update for every lane
+        active = self.active
+        self.prev_x[:] = self.x
+        self.prev_y[:] = self.y
+        self.trail[:, self.trail_head, 0] = self.x
+        self.trail[:, self.trail_head, 1] = self.y
+        self.trail_head = (self.trail_head + 1) % TRAIL_LENGTH
+        np.minimum(self.trail_len + 1, TRAIL_LENGTH, out=self.trail_len)
+
+        self.x += self.dx * active
+        self.y += self.dy * active
+        config = self.config
+        self.dy += config.gravity * active
+        self.dx[active] *= config.air_resistance
+
+        # Court boundaries
+        side = active & ((self.x <= config.court_x) | (self.x >= config.court_right))
+        self.dx[side] = -self.dx[side]
+        top = active & (self.y <= config.court_y)
+        bottom = active & ~top & (self.y >= config.court_bottom)
+        self.dy[top] = np.abs(self.dy[top])
+        self.dy[bottom] = -np.abs(self.dy[bottom])
+
+    def score(self):
+        # Out-of-bounds checks from TennisMatch.update
+        player2_point = self.active & (self.x < self.config.court_x)
+        player1_point = self.active & (self.x > self.config.court_right)
+        scored = np.flatnonzero(player1_point | player2_point)
+        if len(scored):
+            players = np.where(player2_point[scored], 2, 1)
+            states = self.score_table.add_points(self.score_state[scored], players)
+            self.score_state[scored] = states
+            self.active[scored] = ~self.score_table.finished[states]
+            self.points[scored] += 1
+            self.serve(scored)
+
+    def step(self):
+        swinging = self.swing()
+        if swinging.any():
+            self.hit(swinging)
+        self.move_players()
+        self.move_balls()
+        self.ticks += self.active
+        self.tick += 1
+        self.score()
+
+    def run(self, max_ticks=MAX_TICKS):
+        while self.tick < max_ticks and self.active.any():
+            self.step()
+        return self.results()
+
+    def results(self):
+        table = self.score_table
+        states = self.score_state
+        return {
+            "winner": table.winner[states].astype(np.int64),
+            "player1_sets": table.sets1[states].astype(np.int64),
+            "player2_sets": table.sets2[states].astype(np.int64),
+            "points": self.points,
+            "hits": self.hits,
+            "ticks": self.ticks
+        }
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 1000
+    difficulty = None
+    if "--ai" in sys.argv:
+        difficulty = sys.argv[sys.argv.index("--ai") + 1]
+    start = time.perf_counter()
+    results = BatchSimulator(count, seed=0, difficulty=difficulty).run()
+    elapsed = time.perf_counter() - start
+    finished = results["winner"] > 0
+    print(f"{count} matches in {elapsed:.2f}s ({count / elapsed:.0f} matches/s)")
+    print(f"Player 1 won {np.mean(results['winner'][finished] == 1):.1%} of {finished.sum()} finished matches")
+    print(f"{results['ticks'].sum() / elapsed:.0f} match ticks/s")
@@ -0,0 +1,196 @@
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import pygame
+
+from tennis_game import (TennisGame, TennisMatch, TennisScoring, Ball, Player,
+                         SCREEN_WIDTH, SCREEN_HEIGHT, COURT_X, COURT_Y, COURT_HEIGHT, BLUE)
+from headless import HeadlessMatch, HeadlessKeys
+
+# Relative slowdown against the baseline that counts as a regression
+DEFAULT_THRESHOLD = 0.10
+
+def best_rate(func, count, repeats):
+    # Best of several runs, as operations per second
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(count)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return count / best
+
+def best_time(func, count, repeats):
+    # Best of several runs, as milliseconds per call
+    return 1000.0 / best_rate(func, count, repeats)
+
+def bench_ball_update(count):
+    ball = Ball(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2, random.Random(0))
+    for _ in range(count):
+        ball.update()
+
+def bench_player_update(count):
+    player = Player(COURT_X + 50, COURT_Y + COURT_HEIGHT // 2, BLUE)
+    up = HeadlessKeys()
+    up.pressed.update((pygame.K_w, pygame.K_d))
+    down = HeadlessKeys()
+    down.pressed.update((pygame.K_s, pygame.K_a))
+    for i in range(count):
+        player.update(up if i % 100 < 50 else down)
+
+def bench_match_update(count):
+    match = TennisMatch(0)
+    keys = HeadlessKeys()
+    for _ in range(count):
+        match.update(keys)
+
+def bench_headless_step(count):
+    match = HeadlessMatch(0)
+    for _ in range(count):
+        match.step()
+
+def bench_scoring(count):
+    rng = random.Random(0)
+    winners = [rng.choice((1, 2)) for _ in range(1000)]
+    scoring = TennisScoring()
+    for i in range(count):
+        scoring.add_point(winners[i % 1000])
+        if scoring.game_over:
+            scoring = TennisScoring()
+
+def render_benchmarks(frames, repeats):
+    # Offscreen frame times of every draw step, SDL's dummy driver keeps it
+    # windowless so this runs on CI and headless boxes alike
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    game = TennisGame()
+    game.start_new_game()
+    keys = HeadlessKeys()
+    for _ in range(200):
+        game.match.update(keys)
+
+    def frames_of(draw, state="PLAYING"):
+        def run(count):
+            game.state = state
+            for _ in range(count):
+                draw()
+        return run
+
+    screen = game.screen
+    cases = {
+        "draw_court": frames_of(game.draw_court),
+        "draw_score": frames_of(game.draw_score),
+        "draw_menu": frames_of(game.draw_menu, "MENU"),
+        "draw_instructions": frames_of(game.draw_instructions, "INSTRUCTIONS"),
+        "draw_paused": frames_of(game.draw_paused, "PAUSED"),
+        "draw_game_over": frames_of(game.draw_game_over, "GAME_OVER"),
+        "ball_draw": frames_of(lambda: game.match.ball.draw(screen)),
+        "player_draw": frames_of(lambda: game.match.player1.draw(screen)),
+        "frame_playing": frames_of(game.draw),
+        "frame_menu": frames_of(game.draw, "MENU")
+    }
+    results = {}
+    for name, run in cases.items():
+        results[name] = {"value": best_time(run, frames, repeats), "unit": "ms/frame",
+                         "higher_is_better": False}
+    pygame.quit()
+    return results
+
+def startup_benchmarks(repeats):
+    # Wall time of fresh interpreters, as the kiosk and test runs pay it: up
+    # to the first menu frame, and up to one headless tick
+    env = dict(os.environ)
+    env.setdefault("SDL_VIDEODRIVER", "dummy")
+    env["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+    here = os.path.dirname(os.path.abspath(__file__))
+    commands = {
+        "cold_start_menu": [sys.executable, os.path.join(here, "tennis_game.py"), "--startup-check"],
+        "cold_start_headless": [sys.executable, "-c", "import headless; headless.HeadlessMatch(0).step()"]
+    }
+    results = {}
+    for name, command in commands.items():
+        best = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=here, env=env, stdout=subprocess.DEVNULL)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        results[name] = {"value": best * 1000, "unit": "ms", "higher_is_better": False}
+    return results
+
+def run_benchmarks(quick=False, render=True, startup=True):
+    scale = 10 if quick else 1
+    repeats = 3 if quick else 5
+    rates = {
+        "ball_update": (bench_ball_update, 200000, "ticks/s"),
+        "player_update": (bench_player_update, 200000, "ticks/s"),
+        "match_update": (bench_match_update, 100000, "ticks/s"),
+        "headless_step": (bench_headless_step, 100000, "ticks/s"),
+        "scoring_add_point": (bench_scoring, 200000, "points/s")
+    }
+    results = {}
+    for name, (func, count, unit) in rates.items():
+        results[name] = {"value": best_rate(func, count // scale, repeats), "unit": unit,
+                         "higher_is_better": True}
+    if render:
+        results.update(render_benchmarks(200 // scale, repeats))
+    if startup:
+        results.update(startup_benchmarks(repeats))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    # Returns one (name, baseline, current, change, regressed) row per shared benchmark
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        change = (result["value"] - base["value"]) / base["value"]
+        if not result["higher_is_better"]:
+            change = -change
+        rows.append((name, base["value"], result["value"], change, change < -threshold))
+    return rows
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark physics, scoring and rendering")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag regressions against a stored run")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, noisier numbers")
+    parser.add_argument("--no-render", action="store_true", help="skip the draw_* benchmarks")
+    parser.add_argument("--no-startup", action="store_true", help="skip the cold start benchmarks")
+    args = parser.parse_args()
+
+    current = run_benchmarks(args.quick, not args.no_render, not args.no_startup)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = 0
+        for name, base, value, change, regressed in compare(current, baseline, args.threshold):
+            flag = "REGRESSION" if regressed else "ok"
+            print(f"{name:20} {base:14.3f} -> {value:14.3f} {change:+7.1%}  {flag}")
+            regressions += regressed
+        sys.exit(1 if regressions else 0)
+    else:
+        for name, result in current["results"].items():
+            print(f"{name:20} {result['value']:14.3f} {result['unit']}")
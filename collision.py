@@ -0,0 +1,121 @@
+# Ball against player collision: a uniform grid broad phase over every
+# player's body and racket hitbox, then a swept test of each ball's path over
+# the last tick, so a fast ball can't skip through a hitbox between ticks.
+
+CELL_SIZE = 64
+
+BODY = "body"
+RACKET = "racket"
+
+class Hitbox:
+    __slots__ = ("owner", "part", "left", "top", "right", "bottom")
+
+    def __init__(self, owner, part, rect):
+        self.owner = owner
+        self.part = part
+        self.left = rect.left
+        self.top = rect.top
+        self.right = rect.right
+        self.bottom = rect.bottom
+
+def player_hitboxes(player):
+    return (Hitbox(player, BODY, player.get_rect()), Hitbox(player, RACKET, player.get_racket_rect()))
+
+def sweep(x0, y0, x1, y1, radius, box):
+    # Earliest time in [0, 1] at which a ball moving from (x0, y0) to (x1, y1)
+    # overlaps the box, or None. The box is grown by the radius and tested
+    # with open edges like Rect.colliderect.
+    enter = 0.0
+    leave = 1.0
+    for start, delta, low, high in ((x0, x1 - x0, box.left - radius, box.right + radius),
+                                    (y0, y1 - y0, box.top - radius, box.bottom + radius)):
+        if delta == 0:
+            if start <= low or start >= high:
+                return None
+            continue
+        t0 = (low - start) / delta
+        t1 = (high - start) / delta
+        if t0 > t1:
+            t0, t1 = t1, t0
+        if t0 > enter:
+            enter = t0
+        if t1 < leave:
+            leave = t1
+        if enter >= leave:
+            return None
+    return enter
+
+class SpatialGrid:
+    # Hitboxes bucketed by every cell they cover; cell lists are kept and
+    # emptied between ticks instead of rebuilt
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.used = []
+
+    def clear(self):
+        for cell in self.used:
+            cell.clear()
+        self.used.clear()
+
+    def cell_range(self, left, top, right, bottom):
+        size = self.cell_size
+        return (range(int(left // size), int(right // size) + 1),
+                range(int(top // size), int(bottom // size) + 1))
+
+    def insert(self, box):
+        columns, rows = self.cell_range(box.left, box.top, box.right, box.bottom)
+        for column in columns:
+            for row in rows:
+                cell = self.cells.get((column, row))
+                if cell is None:
+                    cell = self.cells[(column, row)] = []
+                if not cell:
+                    self.used.append(cell)
+                cell.append(box)
+
+    def query(self, left, top, right, bottom):
+        columns, rows = self.cell_range(left, top, right, bottom)
+        if len(columns) == 1 and len(rows) == 1:
+            return self.cells.get((columns[0], rows[0]), ())
+        found = set()
+        for column in columns:
+            for row in rows:
+                found.update(self.cells.get((column, row), ()))
+        return found
+
+class CollisionWorld:
+    def __init__(self, cell_size=CELL_SIZE):
+        self.grid = SpatialGrid(cell_size)
+        self.order = {}
+
+    def build(self, players):
+        # Call once per tick after the players moved
+        self.grid.clear()
+        self.order.clear()
+        for i, player in enumerate(players):
+            self.order[player] = i
+            for box in player_hitboxes(player):
+                self.grid.insert(box)
+
+    def first_contact(self, ball):
+        # (time, hitbox) of the first hitbox the ball touched on its way from
+        # its previous position, ties going to the earlier player and the body
+        radius = ball.radius
+        x0, y0, x1, y1 = ball.prev_x, ball.prev_y, ball.x, ball.y
+        candidates = self.grid.query(min(x0, x1) - radius, min(y0, y1) - radius,
+                                     max(x0, x1) + radius, max(y0, y1) + radius)
+        best = None
+        for box in candidates:
+            t = sweep(x0, y0, x1, y1, radius, box)
+            if t is None:
+                continue
+            key = (t, self.order[box.owner], box.part != BODY)
+            if best is None or key < best[0]:
+                best = (key, box)
+        return None if best is None else (best[0][0], best[1])
+
+    def contacts(self, balls, players):
+        # First contact of every ball, with None for balls that touch nothing
+        self.build(players)
+        return [self.first_contact(ball) for ball in balls]
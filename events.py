@@ -0,0 +1,205 @@
+import json
+import os
+import queue
+import threading
+from collections import namedtuple
+
+# Event kinds
+POINT = 1
+GAME = 2
+SET = 3
+MATCH = 4
+HIT = 5
+# How summarize() labels the count of each kind
+KIND_NAMES = {POINT: "points", GAME: "games", SET: "sets", MATCH: "finished_matches", HIT: "hits"}
+
+# One event as TennisMatch emits it: who scored, won or hit, where the ball
+# and both players were, and the score right after the event
+Event = namedtuple("Event", ["match", "tick", "kind", "player",
+                             "ball_x", "ball_y", "ball_dx", "ball_dy",
+                             "player1_x", "player1_y", "player2_x", "player2_y",
+                             "player1_points", "player2_points", "player1_games", "player2_games",
+                             "player1_sets", "player2_sets"])
+
+# Fixed-width on-disk type of every Event field, in field order. Deuce points
+# and games in a long set aren't capped, so those get 16 bits.
+COLUMN_TYPES = ("<u4", "<i8", "u1", "u1",
+                "<f4", "<f4", "<f4", "<f4",
+                "<f4", "<f4", "<f4", "<f4",
+                "<u2", "<u2", "<u2", "<u2",
+                "u1", "u1")
+
+CHUNK_SIZE = 65536
+MAX_PENDING_CHUNKS = 8
+SCHEMA_FILE = "schema.json"
+
+class MemorySink:
+    # Keeps every event in a list, for tests and small runs
+    def __init__(self):
+        self.events = []
+
+    def write(self, event):
+        self.events.append(event)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class ColumnarSink:
+    # Append-only column files, one per Event field, written by a background
+    # thread. Events are copied into a fixed pool of record-array chunks; a
+    # full chunk is handed to the writer and a free one taken in its place, so
+    # memory stays at (max_pending + 1) chunks. When the writer falls that far
+    # behind, whole chunks are dropped (and counted in dropped) instead of
+    # stalling the game loop, unless blocking is set.
+    def __init__(self, directory, chunk_size=CHUNK_SIZE, max_pending=MAX_PENDING_CHUNKS, blocking=False):
+        import numpy as np
+
+        self.directory = directory
+        self.blocking = blocking
+        os.makedirs(directory, exist_ok=True)
+        dtype = np.dtype(list(zip(Event._fields, COLUMN_TYPES)))
+        write_schema(directory, dtype)
+
+        self.free = queue.Queue()
+        for _ in range(max_pending + 1):
+            self.free.put(np.zeros(chunk_size, dtype=dtype))
+        self.pending = queue.Queue()
+        self.chunk = self.free.get()
+        self.count = 0
+
+        self.files = [open(column_path(directory, name), "ab") for name in Event._fields]
+        self.written = 0
+        self.dropped = 0
+        self.error = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.writer, name="event-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, event):
+        self.chunk[self.count] = event
+        self.count += 1
+        if self.count == len(self.chunk):
+            self.submit()
+
+    def submit(self, done=None):
+        # Queues the current chunk and takes a free one in its place. If none
+        # is free and we may not wait, the chunk's events are dropped and the
+        # chunk reused. done, if given, is set once the writer has written and
+        # flushed everything queued up to here; waiting for it anyway, that
+        # call also waits for a free chunk rather than drop one.
+        if self.count:
+            if self.blocking or done is not None:
+                fresh = self.free.get()
+            else:
+                try:
+                    fresh = self.free.get_nowait()
+                except queue.Empty:
+                    fresh = None
+            if fresh is None:
+                self.dropped += 1
+            else:
+                self.pending.put((self.chunk, self.count, None))
+                self.chunk = fresh
+            self.count = 0
+        if done is not None:
+            self.pending.put((None, 0, done))
+
+    def writer(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                break
+            chunk, count, done = item
+            try:
+                if chunk is not None:
+                    for name, f in zip(Event._fields, self.files):
+                        # Copied out to a contiguous column, then one write per file
+                        f.write(chunk[name][:count].tobytes())
+                    self.written += count
+                if done is not None:
+                    for f in self.files:
+                        f.flush()
+            except OSError as e:
+                self.error = e
+            if chunk is not None:
+                self.free.put(chunk)
+            if done is not None:
+                done.set()
+
+    def flush(self):
+        # Hands over the partial chunk and waits until it is on disk
+        done = threading.Event()
+        self.submit(done)
+        done.wait()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.flush()
+        self.pending.put(None)
+        self.thread.join()
+        for f in self.files:
+            f.close()
+        if self.error is not None:
+            raise self.error
+
+def column_path(directory, name):
+    return os.path.join(directory, name + ".col")
+
+def write_schema(directory, dtype):
+    path = os.path.join(directory, SCHEMA_FILE)
+    schema = {"fields": [[name, dtype[name].str] for name in dtype.names]}
+    if os.path.exists(path):
+        with open(path) as f:
+            if json.load(f) != schema:
+                raise ValueError(f"{directory} holds events with a different schema")
+        return
+    with open(path, "w") as f:
+        json.dump(schema, f)
+
+def load_columns(directory):
+    # Read-only memory maps of every column, cut to the rows all columns have
+    # (a crash can leave the last chunk half written). Nothing is read until
+    # a column is actually scanned.
+    import numpy as np
+
+    with open(os.path.join(directory, SCHEMA_FILE)) as f:
+        fields = json.load(f)["fields"]
+    sizes = {}
+    for name, type_str in fields:
+        sizes[name] = os.path.getsize(column_path(directory, name)) // np.dtype(type_str).itemsize
+    rows = min(sizes.values())
+    columns = {}
+    for name, type_str in fields:
+        if rows:
+            columns[name] = np.memmap(column_path(directory, name), dtype=type_str, mode="r", shape=(rows,))
+        else:
+            columns[name] = np.empty(0, dtype=type_str)
+    return columns
+
+def summarize(columns):
+    import numpy as np
+
+    kinds = np.bincount(columns["kind"], minlength=max(KIND_NAMES) + 1)
+    summary = {"events": int(len(columns["kind"])),
+               "matches": int(len(np.unique(columns["match"])))}
+    for kind, name in KIND_NAMES.items():
+        summary[name] = int(kinds[kind])
+    return summary
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Scan a columnar event log")
+    parser.add_argument("directory")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = summarize(load_columns(args.directory))
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    print(json.dumps(summary, indent=2))
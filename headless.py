@@ -0,0 +1,169 @@
+import random
+from collections import namedtuple
+
+import pygame
+
+from tennis_game import TennisMatch, DEFAULT_CONFIG
+
+# Ticks a bot waits between swings, roughly how fast a human can tap SPACE
+SWING_COOLDOWN = 15
+
+# Safety net for rallies that never leave the court (e.g. a ball slowed to a crawl)
+MAX_TICKS = 2000000
+
+# Kept to plain ints and tuples so it stays cheap to pickle between processes
+MatchResult = namedtuple("MatchResult", ["seed", "winner", "player1_sets", "player2_sets",
+                                         "set_scores", "points", "hits", "ticks"])
+
+PLAYER1_KEYS = (pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d)
+PLAYER2_KEYS = (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT)
+
+class HeadlessKeys:
+    # Stand-in for pygame.key.get_pressed() that works without a display
+    def __init__(self):
+        self.pressed = set()
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+class BotController:
+    # Holds its baseline, tracks the ball vertically and swings when it is close
+    def __init__(self, player, rng, reaction=0.9):
+        self.player = player
+        self.rng = rng
+        self.reaction = reaction
+        self.home_x = player.x
+        self.cooldown = 0
+        up, down, left, right = PLAYER1_KEYS if player.is_player1 else PLAYER2_KEYS
+        self.up = up
+        self.down = down
+        self.left = left
+        self.right = right
+
+    def in_own_half(self, ball):
+        return (ball.x < self.player.config.center_x) == self.player.is_player1
+
+    def incoming(self, ball):
+        return self.in_own_half(ball) or (ball.dx < 0) == self.player.is_player1
+
+    def press(self, keys, ball):
+        # Occasionally miss a beat so matches are not decided by the seed alone
+        if self.rng.random() > self.reaction:
+            return
+
+        player = self.player
+        center_y = player.y + player.height // 2
+        if ball.y < center_y - player.speed:
+            keys.pressed.add(self.up)
+        elif ball.y > center_y + player.speed:
+            keys.pressed.add(self.down)
+
+        # Walk up to balls that have died in our half, otherwise hold the baseline
+        target_x = self.home_x
+        if abs(ball.dx) < 1 and self.in_own_half(ball):
+            target_x = ball.x - player.width // 2
+        if target_x < player.x - player.speed:
+            keys.pressed.add(self.left)
+        elif target_x > player.x + player.speed:
+            keys.pressed.add(self.right)
+
+    def wants_hit(self, ball):
+        # SPACE is a single KEYDOWN, so bots can't swing every tick either
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return False
+        if not self.incoming(ball):
+            return False
+        player = self.player
+        reach = ball.radius + player.height
+        if (abs(ball.x - (player.x + player.width // 2)) < reach and
+                abs(ball.y - (player.y + player.height // 2)) < reach):
+            self.cooldown = SWING_COOLDOWN
+            # Mistimed swings are what eventually ends a rally
+            return self.rng.random() < self.reaction
+        return False
+
+def per_side(value):
+    # A (player 1, player 2) pair, or one value for both
+    if isinstance(value, (tuple, list)):
+        return tuple(value)
+    return value, value
+
+class HeadlessMatch:
+    # Steps TennisMatch as fast as possible: no window, no fonts, no frame cap.
+    # reaction and difficulty take a (player 1, player 2) pair for uneven bots.
+    def __init__(self, seed=None, reaction=0.9, difficulty=None, config=DEFAULT_CONFIG, events=None,
+                 best_of=3):
+        self.seed = seed
+        self.match = TennisMatch(seed, config, best_of)
+        if events is not None:
+            self.match.set_event_sink(events, 0 if seed is None else seed)
+        # Bots get their own stream so their decisions don't shift the ball's
+        # RNG, which keeps a recorded match replayable from its seed alone
+        bot_rng = random.Random(None if seed is None else f"bots-{seed}")
+        players = (self.match.player1, self.match.player2)
+        if difficulty is None:
+            self.controllers = [BotController(player, bot_rng, side_reaction)
+                                for player, side_reaction in zip(players, per_side(reaction))]
+        else:
+            # Lookahead AI on both sides, see ai.py
+            from ai import AIController
+            
+            self.controllers = [AIController(player, bot_rng, side_difficulty)
+                                for player, side_difficulty in zip(players, per_side(difficulty))]
+        self.keys = HeadlessKeys()
+
+    def step(self):
+        match = self.match
+        keys = self.keys
+        keys.pressed.clear()
+
+        # SPACE events are handled before the update, like in TennisGame.run
+        # Every controller is asked so both swing cooldowns keep ticking
+        swing = False
+        for controller in self.controllers:
+            if controller.wants_hit(match.ball):
+                swing = True
+        if swing:
+            match.hit_ball()
+
+        for controller in self.controllers:
+            controller.press(keys, match.ball)
+
+        return match.update(keys)
+
+    def run(self, max_ticks=MAX_TICKS):
+        scoring = self.match.scoring
+        points = 0
+        while not scoring.game_over and self.match.ticks < max_ticks:
+            if self.step() is not None:
+                points += 1
+
+        return MatchResult(self.seed, scoring.winner, scoring.player1_sets, scoring.player2_sets,
+                           tuple(scoring.set_scores), points, self.match.hits, self.match.ticks)
+
+def run_match(seed, max_ticks=MAX_TICKS, difficulty=None, config=DEFAULT_CONFIG):
+    return HeadlessMatch(seed, difficulty=difficulty, config=config).run(max_ticks)
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 10
+    difficulty = None
+    if "--ai" in sys.argv:
+        difficulty = sys.argv[sys.argv.index("--ai") + 1]
+    events = None
+    if "--events" in sys.argv:
+        from events import ColumnarSink
+
+        # Nothing to keep smooth here, so wait for the writer instead of dropping
+        events = ColumnarSink(sys.argv[sys.argv.index("--events") + 1], blocking=True)
+    start = time.perf_counter()
+    for seed in range(count):
+        result = HeadlessMatch(seed, difficulty=difficulty, events=events).run()
+        print(result)
+    if events is not None:
+        events.close()
+    elapsed = time.perf_counter() - start
+    print(f"{count} matches in {elapsed:.2f}s")
@@ -0,0 +1,105 @@
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+from headless import run_match, MAX_TICKS
+
+def run_chunk(seeds, max_ticks=MAX_TICKS):
+    # Runs inside a worker: every match builds its own seeded RNG, nothing but
+    # the seeds goes in and nothing but MatchResult tuples comes back out
+    return [run_match(seed, max_ticks) for seed in seeds]
+
+class MatchSummary:
+    def __init__(self):
+        self.matches = 0
+        self.unfinished = 0
+        self.wins = Counter()
+        self.set_results = Counter()
+        self.points = 0
+        self.hits = 0
+        self.ticks = 0
+        self.min_ticks = None
+        self.max_ticks = None
+
+    def add(self, result):
+        self.matches += 1
+        if result.winner is None:
+            self.unfinished += 1
+        else:
+            self.wins[result.winner] += 1
+            self.set_results[f"{result.player1_sets}-{result.player2_sets}"] += 1
+        self.points += result.points
+        self.hits += result.hits
+        self.ticks += result.ticks
+        if self.min_ticks is None or result.ticks < self.min_ticks:
+            self.min_ticks = result.ticks
+        if self.max_ticks is None or result.ticks > self.max_ticks:
+            self.max_ticks = result.ticks
+
+    def as_dict(self):
+        matches = max(self.matches, 1)
+        return {
+            "matches": self.matches,
+            "unfinished": self.unfinished,
+            "player1_wins": self.wins[1],
+            "player2_wins": self.wins[2],
+            "set_results": dict(self.set_results),
+            "avg_points": self.points / matches,
+            "avg_hits_per_point": self.hits / max(self.points, 1),
+            "avg_ticks": self.ticks / matches,
+            "min_ticks": self.min_ticks,
+            "max_ticks": self.max_ticks
+        }
+
+class MatchFarm:
+    # Spreads matches over a process pool and streams results back as chunks finish
+    def __init__(self, workers=None, chunk_size=4, max_ticks=MAX_TICKS):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.max_ticks = max_ticks
+
+    def results(self, count, first_seed=0):
+        seeds = range(first_seed, first_seed + count)
+        chunks = (seeds[i:i + self.chunk_size] for i in range(0, count, self.chunk_size))
+        # Only keep a couple of chunks per worker in flight so huge runs
+        # don't queue millions of futures up front
+        max_pending = self.workers * 2
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = set()
+            for chunk in chunks:
+                pending.add(executor.submit(run_chunk, chunk, self.max_ticks))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+            for future in as_completed(pending):
+                yield from future.result()
+
+    def run(self, count, first_seed=0):
+        summary = MatchSummary()
+        for result in self.results(count, first_seed):
+            summary.add(result)
+        return summary
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(description="Run headless matches across all cores")
+    parser.add_argument("--matches", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=4)
+    args = parser.parse_args()
+
+    farm = MatchFarm(args.workers, args.chunk_size)
+    start = time.perf_counter()
+    summary = farm.run(args.matches, args.seed)
+    elapsed = time.perf_counter() - start
+    stats = summary.as_dict()
+    stats["workers"] = farm.workers
+    stats["seconds"] = elapsed
+    stats["matches_per_second"] = args.matches / elapsed
+    print(json.dumps(stats, indent=2))
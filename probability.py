@@ -0,0 +1,187 @@
+from functools import lru_cache
+
+import numpy as np
+
+# Same rules as TennisScoring: games to 4 points with a 2-point lead (deuce and
+# advantage), sets to 6 games with a 2-game lead and no tiebreak, best of 3 sets.
+POINTS_TO_WIN = 4
+GAMES_TO_WIN = 6
+
+class OutcomeModel:
+    # Exact win probabilities for player 1 from any score, by memoized dynamic
+    # programming over (points, games, sets). Deuce and long sets are solved in
+    # closed form, so the state space stays finite.
+    #
+    # p_serve is the chance player 1 wins a point on their own serve and
+    # p_return the chance they win one on player 2's serve; with only p_serve
+    # every point is won with that probability. Both may be NumPy arrays, and
+    # every result broadcasts over them.
+    def __init__(self, p_serve, p_return=None, best_of=3):
+        if p_return is None:
+            p_return = p_serve
+        self.p_serve, self.p_return = np.broadcast_arrays(np.asarray(p_serve, dtype=float),
+                                                          np.asarray(p_return, dtype=float))
+        self.best_of = best_of
+        self.sets_to_win = best_of // 2 + 1
+        self.zeros = np.zeros(self.p_serve.shape)
+        self.ones = np.ones(self.p_serve.shape)
+
+        self.game_memo = {}
+        self.set_memo = {}
+        self.match_memo = {}
+        # Chance player 1 wins a whole game served by player 1 or player 2
+        self.game_win = {1: self.game_from(0, 0, 1), 2: self.game_from(0, 0, 2)}
+
+    def point_win(self, server):
+        return self.p_serve if server == 1 else self.p_return
+
+    def game_from(self, points1, points2, server):
+        if points1 >= POINTS_TO_WIN and points1 - points2 >= 2:
+            return self.ones
+        if points2 >= POINTS_TO_WIN and points2 - points1 >= 2:
+            return self.zeros
+
+        p = self.point_win(server)
+        q = 1 - p
+        if points1 >= 3 and points2 >= 3:
+            # Deuce, then advantage either way: closed form of the endless chain
+            with np.errstate(divide="ignore", invalid="ignore"):
+                deuce = np.where(p * p + q * q > 0, p * p / (p * p + q * q), 0.5)
+            lead = points1 - points2
+            if lead == 0:
+                return deuce
+            return p + q * deuce if lead > 0 else p * deuce
+
+        key = (points1, points2, server)
+        result = self.game_memo.get(key)
+        if result is None:
+            result = (p * self.game_from(points1 + 1, points2, server) +
+                      q * self.game_from(points1, points2 + 1, server))
+            self.game_memo[key] = result
+        return result
+
+    def set_end(self, player1_wins, next_server):
+        # (win, next server 1), (win, next server 2), (loss, 1), (loss, 2)
+        outcome = [self.zeros] * 4
+        outcome[(0 if player1_wins else 2) + next_server - 1] = self.ones
+        return tuple(outcome)
+
+    def set_from(self, games1, games2, server):
+        # Outcome split by who serves first in the next set, as the serve
+        # keeps alternating across sets
+        if games1 >= GAMES_TO_WIN and games1 - games2 >= 2:
+            return self.set_end(True, server)
+        if games2 >= GAMES_TO_WIN and games2 - games1 >= 2:
+            return self.set_end(False, server)
+
+        other = 3 - server
+        if games1 == games2 and games1 >= GAMES_TO_WIN - 1:
+            # Level late in the set: every pair of games either settles it or
+            # comes back to level with the same server
+            both = self.game_win[server] * self.game_win[other]
+            neither = (1 - self.game_win[server]) * (1 - self.game_win[other])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                win = np.where(both + neither > 0, both / (both + neither), 0.5)
+            outcome = [self.zeros] * 4
+            outcome[server - 1] = win
+            outcome[2 + server - 1] = 1 - win
+            return tuple(outcome)
+
+        key = (games1, games2, server)
+        result = self.set_memo.get(key)
+        if result is None:
+            g = self.game_win[server]
+            won = self.set_from(games1 + 1, games2, other)
+            lost = self.set_from(games1, games2 + 1, other)
+            result = tuple(g * a + (1 - g) * b for a, b in zip(won, lost))
+            self.set_memo[key] = result
+        return result
+
+    def match_from(self, sets1, sets2, server):
+        # Match win probability at the start of a set
+        if sets1 >= self.sets_to_win:
+            return self.ones
+        if sets2 >= self.sets_to_win:
+            return self.zeros
+
+        key = (sets1, sets2, server)
+        result = self.match_memo.get(key)
+        if result is None:
+            result = self.after_set(self.set_from(0, 0, server), sets1, sets2)
+            self.match_memo[key] = result
+        return result
+
+    def after_set(self, outcome, sets1, sets2):
+        win1, win2, loss1, loss2 = outcome
+        return (win1 * self.match_from(sets1 + 1, sets2, 1) +
+                win2 * self.match_from(sets1 + 1, sets2, 2) +
+                loss1 * self.match_from(sets1, sets2 + 1, 1) +
+                loss2 * self.match_from(sets1, sets2 + 1, 2))
+
+    def set_outcome(self, games1, games2, points1, points2, server):
+        games1, games2 = normalize_games(games1, games2)
+        g = self.game_from(points1, points2, server)
+        won = self.set_from(games1 + 1, games2, 3 - server)
+        lost = self.set_from(games1, games2 + 1, 3 - server)
+        return tuple(g * a + (1 - g) * b for a, b in zip(won, lost))
+
+    def game(self, points1=0, points2=0, server=1):
+        return self.game_from(points1, points2, server)[()]
+
+    def set(self, games1=0, games2=0, points1=0, points2=0, server=1):
+        win1, win2, _, _ = self.set_outcome(games1, games2, points1, points2, server)
+        return (win1 + win2)[()]
+
+    def match(self, sets1=0, sets2=0, games1=0, games2=0, points1=0, points2=0, server=1):
+        if sets1 >= self.sets_to_win or sets2 >= self.sets_to_win:
+            return self.match_from(sets1, sets2, server)[()]
+        outcome = self.set_outcome(games1, games2, points1, points2, server)
+        return self.after_set(outcome, sets1, sets2)[()]
+
+    def from_scoring(self, scoring, server=1):
+        # (game, set, match) win probabilities for player 1 at a TennisScoring state
+        if scoring.sets_to_win != self.sets_to_win:
+            raise ValueError(f"model is best of {self.best_of}, scoring is best of {scoring.best_of}")
+        if scoring.game_over:
+            won = self.ones if scoring.winner == 1 else self.zeros
+            return won[()], won[()], won[()]
+        points = (scoring.player1_points, scoring.player2_points)
+        games = (scoring.player1_games, scoring.player2_games)
+        sets = (scoring.player1_sets, scoring.player2_sets)
+        return (self.game(*points, server),
+                self.set(*games, *points, server),
+                self.match(*sets, *games, *points, server))
+
+def normalize_games(games1, games2):
+    # 8-7 plays out exactly like 6-5, only the lead matters once both reach 5
+    extra = min(games1, games2) - (GAMES_TO_WIN - 1)
+    if extra > 0:
+        return games1 - extra, games2 - extra
+    return games1, games2
+
+@lru_cache(maxsize=1024)
+def cached_model(p_serve, p_return=None, best_of=3):
+    return OutcomeModel(p_serve, p_return, best_of)
+
+def outcome_model(p_serve, p_return=None, best_of=3):
+    # Scalar probabilities reuse a cached model, so repeated lookups for the
+    # same player pairing only pay for a few dict hits
+    if np.ndim(p_serve) == 0 and np.ndim(p_return) == 0:
+        return cached_model(float(p_serve), None if p_return is None else float(p_return), best_of)
+    return OutcomeModel(p_serve, p_return, best_of)
+
+def match_win_probability(p_serve, p_return=None, scoring=None, server=1, best_of=None):
+    # Match length comes from the scoring when there is one, else best of 3
+    if best_of is None:
+        best_of = 3 if scoring is None else scoring.best_of
+    model = outcome_model(p_serve, p_return, best_of)
+    if scoring is None:
+        return model.match(server=server)
+    return model.from_scoring(scoring, server)[2]
+
+if __name__ == "__main__":
+    import sys
+
+    p = float(sys.argv[1]) if len(sys.argv) > 1 else 0.55
+    model = outcome_model(p)
+    print(f"Point {p:.3f} -> game {model.game():.4f}, set {model.set():.4f}, match {model.match():.4f}")
@@ -0,0 +1,178 @@
+import csv
+import json
+import time
+from collections import deque
+
+import pygame
+
+from tennis_game import FPS, WHITE, YELLOW
+
+# TennisGame methods timed every frame
+SECTIONS = ("handle_events", "update", "draw", "draw_dirty", "draw_court", "draw_score",
+            "draw_menu", "draw_instructions", "draw_paused", "draw_game_over", "present")
+
+# A frame counts as dropped when it takes this much longer than the FPS budget
+DROP_TOLERANCE = 1.5
+
+class LatencyHistogram:
+    # Fixed buckets for the whole run, so percentiles cost no memory growth
+    BUCKET_MS = 0.05
+    BUCKETS = 4000  # everything above 200ms lands in the last bucket
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[min(int(ms / self.BUCKET_MS), self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min((bucket + 1) * self.BUCKET_MS, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count if self.count else 0.0, 3),
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max, 3)
+        }
+
+def window_percentile(samples, p):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(int(p / 100.0 * len(ordered)), len(ordered) - 1)]
+
+class FrameProfiler:
+    # Times each TennisGame step per frame, keeps a rolling window for the
+    # on-screen overlay and whole-run histograms for the export at exit
+    def __init__(self, export_path=None, target_fps=FPS, window=300):
+        self.export_path = export_path
+        self.target_fps = target_fps
+        self.budget_ms = 1000.0 / target_fps
+        self.histograms = {name: LatencyHistogram() for name in ("frame", "busy") + SECTIONS}
+        self.windows = {name: deque(maxlen=window) for name in self.histograms}
+        self.current = {}
+        self.frame_start = None
+        self.frames = 0
+        self.dropped = 0
+
+        self.overlay_visible = False
+        self.overlay_font = None
+        self.overlay_surface = None
+        self.overlay_updated = 0.0
+
+    def instrument(self, game):
+        # Shadow the game's methods with timed wrappers on the instance only
+        for name in SECTIONS:
+            setattr(game, name, self.timed(name, getattr(game, name)))
+
+    def timed(self, name, method):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000.0
+                self.current[name] = self.current.get(name, 0.0) + elapsed
+        return wrapper
+
+    def begin_frame(self):
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            # Full frame interval, sleeping in clock.tick included
+            frame_ms = (now - self.frame_start) * 1000.0
+            self.record("frame", frame_ms)
+            self.frames += 1
+            if frame_ms > self.budget_ms * DROP_TOLERANCE:
+                self.dropped += 1
+        self.frame_start = now
+        self.current.clear()
+
+    def end_frame(self):
+        # Called before the frame cap sleeps, so "busy" is the work we did
+        self.record("busy", (time.perf_counter() - self.frame_start) * 1000.0)
+        for name, ms in self.current.items():
+            self.record(name, ms)
+
+    def record(self, name, ms):
+        self.histograms[name].add(ms)
+        self.windows[name].append(ms)
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+
+    def overlay_lines(self):
+        frame = self.windows["frame"]
+        mean = sum(frame) / len(frame) if frame else 0.0
+        lines = [
+            f"FPS {1000.0 / mean if mean else 0.0:5.1f}   dropped {self.dropped}/{self.frames}",
+            "section          p50    p95    p99 ms"
+        ]
+        for name in ("frame", "busy") + SECTIONS:
+            samples = self.windows[name]
+            if samples:
+                lines.append(f"{name:15}{window_percentile(samples, 50):6.2f} "
+                             f"{window_percentile(samples, 95):6.2f} {window_percentile(samples, 99):6.2f}")
+        return lines
+
+    def draw_overlay(self, screen):
+        # Re-rendered a few times a second, blitted every frame
+        now = time.perf_counter()
+        if self.overlay_surface is None or now - self.overlay_updated > 0.25:
+            if self.overlay_font is None:
+                self.overlay_font = pygame.font.Font(None, 20)
+            lines = self.overlay_lines()
+            surface = pygame.Surface((300, 16 * len(lines) + 10))
+            surface.set_alpha(200)
+            for i, line in enumerate(lines):
+                color = YELLOW if i < 2 else WHITE
+                surface.blit(self.overlay_font.render(line, True, color), (5, 5 + 16 * i))
+            self.overlay_surface = surface
+            self.overlay_updated = now
+        rect = self.overlay_surface.get_rect(topright=(screen.get_width() - 10, 10))
+        screen.blit(self.overlay_surface, rect)
+        return rect
+
+    def summary(self):
+        return {
+            "frames": self.frames,
+            "dropped_frames": self.dropped,
+            "target_fps": self.target_fps,
+            "sections": {name: histogram.summary()
+                         for name, histogram in self.histograms.items() if histogram.count}
+        }
+
+    def export(self, path=None):
+        path = path or self.export_path
+        if not path:
+            return
+        summary = self.summary()
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["section", "count", "mean_ms", "p50_ms", "p95_ms", "p99_ms",
+                                 "max_ms", "dropped_frames"])
+                for name, stats in summary["sections"].items():
+                    dropped = summary["dropped_frames"] if name == "frame" else ""
+                    writer.writerow([name, stats["count"], stats["mean_ms"], stats["p50_ms"],
+                                     stats["p95_ms"], stats["p99_ms"], stats["max_ms"], dropped])
+        else:
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=2)
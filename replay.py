@@ -0,0 +1,165 @@
+import struct
+import sys
+from array import array
+
+import pygame
+
+from tennis_game import TennisMatch
+
+# File layout: header, then (input mask, run length) pairs of uint16s.
+# The low byte of a mask holds the movement keys Player.update reads, the
+# high byte how many hit_ball() calls came before that tick, by who swung.
+MAGIC = b"TNRC"
+# Version 2: hits are swept tests against bodies and rackets (collision.py)
+# Version 3: swings record which players swung, not just how often
+VERSION = 3
+
+# (who swung, bit shift, largest count) of each swing count in a mask, in
+# the order they are replayed: the shared SPACE key first, then player 1 and
+# player 2 alone, as TennisGame makes those calls within a tick
+SWING_FIELDS = ((3, 8, 0x7), (1, 11, 0x7), (2, 14, 0x3))
+HEADER = struct.Struct("<4sHqII")
+
+RECORDED_KEYS = (pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d,
+                 pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT)
+KEY_BITS = {key: 1 << i for i, key in enumerate(RECORDED_KEYS)}
+MAX_RUN = 0xFFFF
+
+# Ticks between the state snapshots a ReplayPlayer keeps for seeking
+SNAPSHOT_INTERVAL = 600
+
+class MatchRecording:
+    # Per-tick input log of one match; pass it as TennisMatch.recorder to fill it
+    def __init__(self, seed, inputs=None):
+        self.seed = seed
+        self.inputs = inputs if inputs is not None else array("H")
+
+    def record(self, keys, swings):
+        mask = 0
+        for side, shift, limit in SWING_FIELDS:
+            mask |= min(swings[side], limit) << shift
+        for key, bit in KEY_BITS.items():
+            if keys[key]:
+                mask |= bit
+        self.inputs.append(mask)
+
+    def encode_runs(self):
+        runs = array("H")
+        inputs = self.inputs
+        i = 0
+        while i < len(inputs):
+            mask = inputs[i]
+            run = 1
+            while i + run < len(inputs) and inputs[i + run] == mask and run < MAX_RUN:
+                run += 1
+            runs.append(mask)
+            runs.append(run)
+            i += run
+        return runs
+
+    def save(self, path):
+        runs = self.encode_runs()
+        if sys.byteorder == "big":
+            runs.byteswap()
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.seed, len(self.inputs), len(runs) // 2))
+            f.write(runs.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            magic, version, seed, ticks, run_count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} match recording")
+            runs = array("H")
+            runs.frombytes(f.read(run_count * 4))
+        if sys.byteorder == "big":
+            runs.byteswap()
+
+        inputs = array("H")
+        for i in range(0, len(runs), 2):
+            inputs.extend(array("H", [runs[i]]) * runs[i + 1])
+        if len(inputs) != ticks:
+            raise ValueError(f"{path} is truncated: expected {ticks} ticks, got {len(inputs)}")
+        return cls(seed, inputs)
+
+class RecordedKeys:
+    # Answers keys[K_x] lookups for Player.update from a recorded input mask
+    def __init__(self):
+        self.mask = 0
+
+    def __getitem__(self, key):
+        return bool(self.mask & KEY_BITS.get(key, 0))
+
+class ReplayPlayer:
+    # Re-simulates a recording headlessly, keeping only periodic state
+    # snapshots (never frames) so seeking backwards stays cheap
+    def __init__(self, recording, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.recording = recording
+        self.snapshot_interval = snapshot_interval
+        self.match = TennisMatch(recording.seed)
+        self.keys = RecordedKeys()
+        self.snapshots = {0: self.match.get_state()}
+
+    @property
+    def tick(self):
+        return self.match.ticks
+
+    @property
+    def finished(self):
+        return self.match.ticks >= len(self.recording.inputs)
+
+    def step(self):
+        match = self.match
+        mask = self.recording.inputs[match.ticks]
+        if mask >> 8:
+            swingers = {1: (match.player1,), 2: (match.player2,), 3: None}
+            for side, shift, limit in SWING_FIELDS:
+                for _ in range(mask >> shift & limit):
+                    match.hit_ball(swingers[side])
+        self.keys.mask = mask & 0xFF
+        point = match.update(self.keys)
+        if match.ticks % self.snapshot_interval == 0 and match.ticks not in self.snapshots:
+            self.snapshots[match.ticks] = match.get_state()
+        return point
+
+    def seek(self, tick):
+        tick = max(0, min(tick, len(self.recording.inputs)))
+        # Resume from the closest snapshot at or before the target when that
+        # is a rewind or saves simulating forward from where we are
+        start = max(t for t in self.snapshots if t <= tick)
+        if tick < self.match.ticks or start > self.match.ticks:
+            self.match.set_state(self.snapshots[start])
+        while self.match.ticks < tick:
+            self.step()
+
+    def run(self):
+        while not self.finished:
+            self.step()
+        return self.match
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Replay a recorded match headlessly")
+    parser.add_argument("path")
+    parser.add_argument("--seek", type=int, default=None, help="stop at this tick")
+    args = parser.parse_args()
+
+    recording = MatchRecording.load(args.path)
+    player = ReplayPlayer(recording)
+    start = time.perf_counter()
+    if args.seek is None:
+        player.run()
+    else:
+        player.seek(args.seek)
+    elapsed = time.perf_counter() - start
+
+    scoring = player.match.scoring
+    print(f"Seed {recording.seed}, {len(recording.inputs)} ticks recorded")
+    print(f"Tick {player.tick}: sets {scoring.player1_sets}-{scoring.player2_sets}, "
+          f"games {scoring.player1_games}-{scoring.player2_games}, "
+          f"points {scoring.get_score_display()[0]}-{scoring.get_score_display()[1]}, "
+          f"winner {scoring.winner}")
+    print(f"Replayed in {elapsed:.3f}s ({player.tick / max(elapsed, 1e-9):.0f} ticks/s)")
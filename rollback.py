@@ -0,0 +1,197 @@
+import random
+from array import array
+from collections import deque
+
+from tennis_game import TennisMatch
+from replay import RecordedKeys
+from server import MOVEMENT, SWING
+
+# How many ticks a peer may run ahead of the last remote input it has.
+# Past that it stalls instead of predicting further.
+ROLLBACK_WINDOW = 16
+
+def step_match(match, keys, mask1, mask2):
+    # One tick from both players' input masks (server.py bit layout)
+    # Player 1's swing first, always, so a re-simulated tick ends the same
+    if mask1 & SWING:
+        match.hit_ball((match.player1,))
+    if mask2 & SWING:
+        match.hit_ball((match.player2,))
+    keys.mask = (mask1 & MOVEMENT) | (mask2 & MOVEMENT) << 4
+    return match.update(keys)
+
+class RollbackSession:
+    # One peer of a two-player match. Local input is applied at once, the
+    # remote player's input is predicted (last known movement, no swing) and
+    # when the real input turns out different the match is restored from the
+    # snapshot ring and the ticks since are simulated again.
+    def __init__(self, player, transport, seed=0, window=ROLLBACK_WINDOW):
+        self.player = player
+        self.transport = transport
+        self.window = window
+        self.match = TennisMatch(seed)
+        self.keys = RecordedKeys()
+
+        # State before each of the last `window` ticks
+        self.snapshots = [None] * window
+        # Inputs cover twice the window since the remote peer can be ahead of us
+        size = window * 2
+        self.local_inputs = array("B", bytes(size))
+        self.remote_inputs = array("B", bytes(size))
+        self.predicted = array("B", bytes(size))
+        self.remote_ticks = array("q", [-1] * size)
+        self.confirmed = -1  # every remote input up to this tick has arrived
+
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.stalls = 0
+
+    def remote_input(self, tick):
+        slot = tick % len(self.remote_ticks)
+        if self.remote_ticks[slot] == tick:
+            return self.remote_inputs[slot]
+        if self.confirmed < 0:
+            return 0
+        return self.remote_inputs[self.confirmed % len(self.remote_ticks)] & MOVEMENT
+
+    def simulate(self, tick, local):
+        self.snapshots[tick % self.window] = self.match.get_state()
+        remote = self.remote_input(tick)
+        self.predicted[tick % len(self.predicted)] = remote
+        if self.player == 1:
+            return step_match(self.match, self.keys, local, remote)
+        return step_match(self.match, self.keys, remote, local)
+
+    def poll(self):
+        # Remote inputs arrive in tick order; the first one that differs from
+        # what was predicted is where the rollback starts
+        size = len(self.remote_ticks)
+        rollback = None
+        for tick, mask in self.transport.receive():
+            slot = tick % size
+            self.remote_inputs[slot] = mask
+            self.remote_ticks[slot] = tick
+            self.confirmed = tick
+            if rollback is None and tick < self.match.ticks and self.predicted[slot] != mask:
+                rollback = tick
+        if rollback is not None:
+            self.rollback(rollback)
+
+    def rollback(self, tick):
+        end = self.match.ticks
+        self.match.set_state(self.snapshots[tick % self.window])
+        for t in range(tick, end):
+            self.simulate(t, self.local_inputs[t % len(self.local_inputs)])
+        self.rollbacks += 1
+        self.resimulated += end - tick
+
+    def advance(self, local_mask):
+        # Runs the next tick with this input, or returns False without doing
+        # anything while the remote player is a whole window behind
+        self.poll()
+        tick = self.match.ticks
+        if tick - self.confirmed > self.window:
+            self.stalls += 1
+            return False
+        self.local_inputs[tick % len(self.local_inputs)] = local_mask
+        self.transport.send(tick, local_mask)
+        self.simulate(tick, local_mask)
+        return True
+
+class SimulatedLink:
+    # Local transport between two sessions with a delay in ticks. Messages
+    # keep their order like over TCP, jitter only ever delays them.
+    def __init__(self, latency=4, jitter=0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.now = 0
+        self.endpoints = (LinkEndpoint(self), LinkEndpoint(self))
+        self.endpoints[0].peer = self.endpoints[1]
+        self.endpoints[1].peer = self.endpoints[0]
+
+    def tick(self):
+        self.now += 1
+
+class LinkEndpoint:
+    def __init__(self, link):
+        self.link = link
+        self.peer = None
+        self.inbox = deque()
+        self.last_delivery = 0
+
+    def send(self, tick, mask):
+        link = self.link
+        delivery = link.now + link.latency + link.rng.randint(0, link.jitter)
+        peer = self.peer
+        peer.last_delivery = max(delivery, peer.last_delivery)
+        peer.inbox.append((peer.last_delivery, tick, mask))
+
+    def receive(self):
+        inbox = self.inbox
+        now = self.link.now
+        while inbox and inbox[0][0] <= now:
+            _, tick, mask = inbox.popleft()
+            yield tick, mask
+
+def scripted_inputs(ticks, seed):
+    # Movement held for a few ticks at a time with the odd swing
+    rng = random.Random(seed)
+    masks = []
+    mask = 0
+    for _ in range(ticks):
+        if rng.random() < 0.1:
+            mask = rng.choice((0, 1, 2, 4, 8, 5, 6, 9, 10))
+        masks.append(mask | (SWING if rng.random() < 0.05 else 0))
+    return masks
+
+def run_simulation(ticks=3000, latency=4, jitter=2, seed=0):
+    # Two peers over a SimulatedLink against a reference match that saw every
+    # input on time; both peers must end up exactly on the reference state
+    inputs = (scripted_inputs(ticks, f"p1-{seed}"), scripted_inputs(ticks, f"p2-{seed}"))
+    link = SimulatedLink(latency, jitter, seed)
+    sessions = [RollbackSession(player, link.endpoints[player - 1], seed) for player in (1, 2)]
+
+    while any(session.match.ticks < ticks for session in sessions):
+        link.tick()
+        for session in sessions:
+            if session.match.ticks < ticks:
+                session.advance(inputs[session.player - 1][session.match.ticks])
+    # Let the last inputs arrive
+    for _ in range(latency + jitter + 1):
+        link.tick()
+    for session in sessions:
+        session.poll()
+
+    reference = TennisMatch(seed)
+    keys = RecordedKeys()
+    for tick in range(ticks):
+        step_match(reference, keys, inputs[0][tick], inputs[1][tick])
+    expected = reference.get_state()
+
+    return {
+        "ticks": ticks,
+        "latency": latency,
+        "jitter": jitter,
+        "consistent": all(session.match.get_state() == expected for session in sessions),
+        "rollbacks": [session.rollbacks for session in sessions],
+        "resimulated": [session.resimulated for session in sessions],
+        "stalls": [session.stalls for session in sessions]
+    }
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(description="Rollback netcode over a simulated-latency link")
+    parser.add_argument("--ticks", type=int, default=3000)
+    parser.add_argument("--latency", type=int, default=4, help="one-way delay in ticks")
+    parser.add_argument("--jitter", type=int, default=2, help="extra random delay in ticks")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = run_simulation(args.ticks, args.latency, args.jitter, args.seed)
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,178 @@
+from functools import lru_cache
+
+import numpy as np
+
+from tennis_game import TennisScoring
+
+# Every distinct in-game point situation TennisScoring can be in, as
+# (player1_points, player2_points, is_deuce, advantage_player). Longer deuce
+# battles only ever come back to one of the last three, so 19 cover them all.
+# 3-3 is kept apart from DEUCE because TennisScoring still shows it as 40-40.
+POINT_STATES = ([(p1, p2, False, None) for p1 in range(4) for p2 in range(4)] +
+                [(4, 3, True, 1), (3, 4, True, 2), (4, 4, True, None)])
+POINT_INDEX = {state: i for i, state in enumerate(POINT_STATES)}
+ADVANTAGE_INDEX = {1: POINT_INDEX[(4, 3, True, 1)], 2: POINT_INDEX[(3, 4, True, 2)],
+                   None: POINT_INDEX[(4, 4, True, None)]}
+
+# Games per player in the current set run 0..MAX_GAMES-1. Sets have no
+# tiebreak, so a marathon set past that is folded back two games at a time,
+# which keeps the lead and who is serving but shows a smaller game count.
+MAX_GAMES = 32
+# Only best-of-3 matches are packed: 0, 1 or 2 sets won, 2 meaning the match is over
+SETS_TO_WIN = 2
+SET_VALUES = SETS_TO_WIN + 1
+STATE_COUNT = len(POINT_STATES) * MAX_GAMES * MAX_GAMES * SET_VALUES * SET_VALUES
+START = 0
+
+def pack(point, games1, games2, sets1, sets2):
+    return (((point * MAX_GAMES + games1) * MAX_GAMES + games2) * SET_VALUES + sets1) * SET_VALUES + sets2
+
+def unpack(state):
+    state, sets2 = divmod(state, SET_VALUES)
+    state, sets1 = divmod(state, SET_VALUES)
+    state, games2 = divmod(state, MAX_GAMES)
+    point, games1 = divmod(state, MAX_GAMES)
+    return point, games1, games2, sets1, sets2
+
+def fold_games(games1, games2):
+    while games1 >= MAX_GAMES or games2 >= MAX_GAMES:
+        games1 -= 2
+        games2 -= 2
+    return games1, games2
+
+def encode(scoring):
+    # Packed integer for a TennisScoring; set_scores history is not kept
+    if scoring.sets_to_win != SETS_TO_WIN:
+        raise ValueError(f"packed scores are best of 3, not best of {scoring.best_of}")
+    if scoring.is_deuce:
+        point = ADVANTAGE_INDEX[scoring.advantage_player]
+    else:
+        point = POINT_INDEX[(scoring.player1_points, scoring.player2_points, False, None)]
+    games1, games2 = fold_games(scoring.player1_games, scoring.player2_games)
+    return pack(point, games1, games2, scoring.player1_sets, scoring.player2_sets)
+
+def decode(state):
+    # TennisScoring.get_state() tuple for a packed state
+    point, games1, games2, sets1, sets2 = unpack(state)
+    points1, points2, is_deuce, advantage_player = POINT_STATES[point]
+    winner = 1 if sets1 >= SETS_TO_WIN else 2 if sets2 >= SETS_TO_WIN else None
+    return (games1, games2, sets1, sets2, points1, points2, is_deuce, advantage_player,
+            winner is not None, winner, ())
+
+def to_scoring(state):
+    scoring = TennisScoring()
+    scoring.set_state(decode(state))
+    return scoring
+
+class ScoreTable:
+    # Precomputed scoring for every packed state. A point only reaches the
+    # games when it wins a game, and the games only reach the sets when they
+    # win a set, so TennisScoring.add_point is run on each of those three
+    # small layers and the full table is put together from them with array
+    # indexing. Stepping the table always agrees with the class; batches step
+    # with array indexing as well.
+    def __init__(self):
+        scoring = TennisScoring()
+
+        def step(games1, games2, sets1, sets2, point_state, player):
+            # Packed fields after add_point, and who won a game and a set
+            winner = 1 if sets1 >= SETS_TO_WIN else 2 if sets2 >= SETS_TO_WIN else None
+            scoring.set_state((games1, games2, sets1, sets2) + point_state + (winner is not None, winner, ()))
+            scoring.add_point(player)
+            game_winner = (1 if scoring.player1_games > games1 else 2 if scoring.player2_games > games2
+                           else 0)
+            set_winner = 1 if scoring.player1_sets > sets1 else 2 if scoring.player2_sets > sets2 else 0
+            return unpack(encode(scoring)), game_winner, set_winner
+
+        # Point situation after each point from a fresh game, and who won the game
+        point_next = np.empty((len(POINT_STATES), 2), dtype=np.int64)
+        game_won = np.zeros((len(POINT_STATES), 2), dtype=np.int64)
+        for point, point_state in enumerate(POINT_STATES):
+            for player in (1, 2):
+                fields, game_won[point, player - 1], _ = step(0, 0, 0, 0, point_state, player)
+                point_next[point, player - 1] = fields[0]
+
+        # Games after each game won (a 40-0 point), and who won the set
+        games_next = np.empty((MAX_GAMES, MAX_GAMES, 2, 3), dtype=np.int64)
+        for games1 in range(MAX_GAMES):
+            for games2 in range(MAX_GAMES):
+                for player in (1, 2):
+                    point_state = (3, 0, False, None) if player == 1 else (0, 3, False, None)
+                    fields, _, set_won = step(games1, games2, 0, 0, point_state, player)
+                    games_next[games1, games2, player - 1] = (fields[1], fields[2], set_won)
+
+        # Sets after each set won (a 40-0 point at 5-0)
+        sets_next = np.empty((SET_VALUES, SET_VALUES, 2, 2), dtype=np.int64)
+        for sets1 in range(SET_VALUES):
+            for sets2 in range(SET_VALUES):
+                for player in (1, 2):
+                    point_state = (3, 0, False, None) if player == 1 else (0, 3, False, None)
+                    games = (5, 0) if player == 1 else (0, 5)
+                    fields, _, _ = step(games[0], games[1], sets1, sets2, point_state, player)
+                    sets_next[sets1, sets2, player - 1] = fields[3:]
+
+        states = np.arange(STATE_COUNT, dtype=np.int64)
+        point, games1, games2, sets1, sets2 = unpack(states)
+        self.point = point.astype(np.uint8)
+        self.games1 = games1.astype(np.uint8)
+        self.games2 = games2.astype(np.uint8)
+        self.sets1 = sets1.astype(np.uint8)
+        self.sets2 = sets2.astype(np.uint8)
+        self.winner = np.where(sets1 >= SETS_TO_WIN, 1, np.where(sets2 >= SETS_TO_WIN, 2, 0)).astype(np.uint8)
+        self.finished = self.winner > 0
+
+        self.transitions = np.empty((STATE_COUNT, 2), dtype=np.int32)
+        for player in (0, 1):
+            next_point = point_next[point, player]
+            game_winner = game_won[point, player]
+            won_game = game_winner > 0
+            after_game = games_next[games1, games2, np.maximum(game_winner - 1, 0)]
+            next_games1 = np.where(won_game, after_game[:, 0], games1)
+            next_games2 = np.where(won_game, after_game[:, 1], games2)
+            set_winner = np.where(won_game, after_game[:, 2], 0)
+            after_set = sets_next[sets1, sets2, np.maximum(set_winner - 1, 0)]
+            next_sets1 = np.where(set_winner > 0, after_set[:, 0], sets1)
+            next_sets2 = np.where(set_winner > 0, after_set[:, 1], sets2)
+            # A finished match ignores further points
+            self.transitions[:, player] = np.where(
+                self.finished, states, pack(next_point, next_games1, next_games2, next_sets1, next_sets2))
+
+        # get_score_display() only depends on the point situation
+        self.point_display = []
+        for point_state in POINT_STATES:
+            scoring.set_state((0, 0, 0, 0) + point_state + (False, None, ()))
+            self.point_display.append(scoring.get_score_display())
+
+    def add_point(self, state, player):
+        return int(self.transitions[state, player - 1])
+
+    def add_points(self, states, players):
+        # states and players are arrays of the same shape, players 1 or 2
+        return self.transitions[states, players - 1]
+
+    def get_score_display(self, state):
+        return self.point_display[self.point[state]]
+
+@lru_cache(maxsize=None)
+def score_table():
+    # Built on first use, in a few tens of milliseconds
+    return ScoreTable()
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    start = time.perf_counter()
+    table = score_table()
+    built = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    states = np.full(10000, START, dtype=np.int32)
+    start = time.perf_counter()
+    for _ in range(count // len(states)):
+        states = table.add_points(states, rng.integers(1, 3, len(states)))
+    elapsed = time.perf_counter() - start
+    print(f"{STATE_COUNT} states, table built in {built:.2f}s")
+    print(f"{count} points in {elapsed:.3f}s ({count / elapsed:.0f} points/s)")
+    print(f"{table.finished[states].sum()} of {len(states)} matches finished")
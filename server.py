@@ -0,0 +1,370 @@
+import asyncio
+import struct
+
+from tennis_game import TennisMatch, TICK_RATE, MAX_CATCH_UP_TICKS
+from replay import RecordedKeys
+from score_table import encode, to_scoring
+from profiler import LatencyHistogram
+
+# Wire format, all little endian. Every message starts with its type byte:
+#   client -> server  HELLO (match id), INPUT (client tick, input mask)
+#   server -> client  WELCOME (player number, tick rate), REJECT (reason),
+#                     SNAPSHOT (tick, changed field mask, changed fields)
+MSG_HELLO, MSG_WELCOME, MSG_INPUT, MSG_SNAPSHOT, MSG_REJECT = range(1, 6)
+HELLO = struct.Struct("<BI")
+WELCOME = struct.Struct("<BBH")
+INPUT = struct.Struct("<BIB")
+SNAPSHOT = struct.Struct("<BIH")
+REJECT = struct.Struct("<BB")
+REJECT_MATCH_FULL = 1
+REJECT_SERVER_FULL = 2
+
+# Input mask bits. Movement lines up with replay.KEY_BITS, player 1 in the
+# low nibble and player 2 in the high one, so RecordedKeys drives Player.update.
+UP, DOWN, LEFT, RIGHT, SWING = (1 << i for i in range(5))
+MOVEMENT = UP | DOWN | LEFT | RIGHT
+
+# Snapshot fields in wire order; only the ones that changed since the last
+# snapshot sent to that client go out. The score is score_table's packed int.
+FIELDS = (("ball_x", "f"), ("ball_y", "f"), ("ball_dx", "f"), ("ball_dy", "f"),
+          ("player1_x", "h"), ("player1_y", "h"), ("player2_x", "h"), ("player2_y", "h"),
+          ("score", "I"), ("hits", "I"))
+FIELD_STRUCTS = [struct.Struct("<" + fmt) for _, fmt in FIELDS]
+
+# Backpressure: bytes the transport may buffer for a client before sends
+# wait, and how long a client may stall before it is dropped
+WRITE_BUFFER = 16 * 1024
+SEND_TIMEOUT = 5.0
+MAX_MATCHES = 1000
+
+def snapshot_fields(match):
+    ball = match.ball
+    values = (ball.x, ball.y, ball.dx, ball.dy,
+              match.player1.x, match.player1.y, match.player2.x, match.player2.y,
+              encode(match.scoring), match.hits)
+    return [packer.pack(value) for packer, value in zip(FIELD_STRUCTS, values)]
+
+class ServerMatch:
+    # One authoritative TennisMatch and its two player slots
+    def __init__(self, match_id, seed=None):
+        self.match_id = match_id
+        self.match = TennisMatch(seed)
+        self.keys = RecordedKeys()
+        self.inputs = [0, 0]
+        self.swings = [False, False]
+        self.clients = [None, None]
+        self.fields = snapshot_fields(self.match)
+
+    @property
+    def running(self):
+        return all(self.clients) and not self.match.scoring.game_over
+
+    def join(self, client):
+        for i, slot in enumerate(self.clients):
+            if slot is None:
+                self.clients[i] = client
+                return i + 1
+        return None
+
+    def leave(self, client):
+        for i, slot in enumerate(self.clients):
+            if slot is client:
+                self.clients[i] = None
+                self.inputs[i] = 0
+
+    def set_input(self, player, mask):
+        # Only the latest movement counts; swings pile up until the next tick
+        self.inputs[player - 1] = mask & MOVEMENT
+        if mask & SWING:
+            self.swings[player - 1] = True
+
+    def step(self):
+        match = self.match
+        # Each client's swing can only return the ball with its own player
+        for i, player in enumerate((match.player1, match.player2)):
+            if self.swings[i]:
+                match.hit_ball((player,))
+                self.swings[i] = False
+        self.keys.mask = self.inputs[0] | self.inputs[1] << 4
+        match.update(self.keys)
+        self.fields = snapshot_fields(match)
+        for client in self.clients:
+            if client is not None:
+                client.notify()
+
+class ClientConnection:
+    # Sends coalesce: a client keeps at most one pending snapshot, always the
+    # newest, so a slow reader costs O(1) memory and simply skips ticks
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.match = None
+        self.player = None
+        self.last_sent = None
+        self.wake = asyncio.Event()
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER)
+
+    def notify(self):
+        if self.wake.is_set():
+            self.server.coalesced += 1
+        self.wake.set()
+
+    def encode_snapshot(self):
+        fields = self.match.fields
+        last = self.last_sent
+        mask = 0
+        changed = []
+        for i, value in enumerate(fields):
+            if last is None or last[i] != value:
+                mask |= 1 << i
+                changed.append(value)
+        self.last_sent = fields
+        return SNAPSHOT.pack(MSG_SNAPSHOT, self.match.match.ticks, mask) + b"".join(changed)
+
+    async def send_loop(self):
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            data = self.encode_snapshot()
+            self.writer.write(data)
+            self.server.snapshots += 1
+            self.server.bytes_sent += len(data)
+            await asyncio.wait_for(self.writer.drain(), SEND_TIMEOUT)
+
+    async def receive_loop(self):
+        while True:
+            kind, _, mask = INPUT.unpack(await self.reader.readexactly(INPUT.size))
+            if kind != MSG_INPUT:
+                raise ConnectionError(f"unexpected message type {kind}")
+            self.match.set_input(self.player, mask)
+
+    async def run(self):
+        kind, match_id = HELLO.unpack(await self.reader.readexactly(HELLO.size))
+        if kind != MSG_HELLO:
+            raise ConnectionError(f"unexpected message type {kind}")
+        match = self.server.get_match(match_id)
+        if match is None:
+            self.writer.write(REJECT.pack(MSG_REJECT, REJECT_SERVER_FULL))
+            return
+        self.player = match.join(self)
+        if self.player is None:
+            self.writer.write(REJECT.pack(MSG_REJECT, REJECT_MATCH_FULL))
+            return
+        self.match = match
+        self.writer.write(WELCOME.pack(MSG_WELCOME, self.player, self.server.tick_rate))
+        self.notify()
+
+        sender = asyncio.create_task(self.send_loop())
+        receiver = asyncio.create_task(self.receive_loop())
+        try:
+            await asyncio.wait((sender, receiver), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            sender.cancel()
+            receiver.cancel()
+            await asyncio.gather(sender, receiver, return_exceptions=True)
+
+class MatchServer:
+    # Steps every match once per tick from a single task; clients only feed
+    # inputs in and drain snapshots out
+    def __init__(self, host="127.0.0.1", port=0, tick_rate=TICK_RATE, max_matches=MAX_MATCHES):
+        self.host = host
+        self.port = port
+        self.tick_rate = tick_rate
+        self.max_matches = max_matches
+        self.matches = {}
+        self.clients = set()
+        self.handlers = set()
+        self.ticks = 0
+        self.snapshots = 0
+        self.coalesced = 0
+        self.bytes_sent = 0
+        self.tick_lateness = LatencyHistogram()
+        self.tick_duration = LatencyHistogram()
+        self.server = None
+        self.tick_task = None
+
+    def get_match(self, match_id):
+        match = self.matches.get(match_id)
+        if match is None and len(self.matches) < self.max_matches:
+            match = self.matches[match_id] = ServerMatch(match_id)
+        return match
+
+    async def handle_client(self, reader, writer):
+        client = ClientConnection(self, reader, writer)
+        self.clients.add(client)
+        self.handlers.add(asyncio.current_task())
+        try:
+            await client.run()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.clients.discard(client)
+            self.handlers.discard(asyncio.current_task())
+            match = client.match
+            if match is not None:
+                match.leave(client)
+                if not any(match.clients):
+                    del self.matches[match.match_id]
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.tick_task = asyncio.create_task(self.tick_loop())
+
+    async def stop(self):
+        self.tick_task.cancel()
+        self.server.close()
+        for client in list(self.clients):
+            client.writer.close()
+        await asyncio.gather(self.tick_task, *self.handlers, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def tick_loop(self):
+        loop = asyncio.get_running_loop()
+        tick_time = 1.0 / self.tick_rate
+        next_tick = loop.time()
+        while True:
+            start = loop.time()
+            self.tick_lateness.add(max(0.0, start - next_tick) * 1000.0)
+            for match in list(self.matches.values()):
+                if match.running:
+                    match.step()
+            self.ticks += 1
+            now = loop.time()
+            self.tick_duration.add((now - start) * 1000.0)
+
+            # Same catch-up cap as TennisGame.run, the rest of a backlog is dropped
+            next_tick += tick_time
+            if now - next_tick > tick_time * MAX_CATCH_UP_TICKS:
+                next_tick = now
+            await asyncio.sleep(max(0.0, next_tick - now))
+
+    def stats(self):
+        return {
+            "matches": len(self.matches),
+            "clients": len(self.clients),
+            "ticks": self.ticks,
+            "tick_lateness": self.tick_lateness.summary(),
+            "tick_duration": self.tick_duration.summary(),
+            "snapshots": self.snapshots,
+            "coalesced": self.coalesced,
+            "bytes_sent": self.bytes_sent
+        }
+
+class LoopbackClient:
+    # Minimal client for tests and load runs: keeps the latest decoded
+    # snapshot fields in self.state
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.player = None
+        self.tick_rate = None
+        self.tick = 0
+        self.state = {name: 0 for name, _ in FIELDS}
+        self.layouts = {}
+
+    async def connect(self, host, port, match_id):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(HELLO.pack(MSG_HELLO, match_id))
+        kind = (await self.reader.readexactly(1))[0]
+        if kind == MSG_REJECT:
+            reason = (await self.reader.readexactly(REJECT.size - 1))[0]
+            raise ConnectionError(f"match {match_id} rejected, reason {reason}")
+        _, self.player, self.tick_rate = WELCOME.unpack(bytes((kind,)) +
+                                                        await self.reader.readexactly(WELCOME.size - 1))
+
+    def layout(self, mask):
+        # Struct and field names for one combination of changed fields
+        layout = self.layouts.get(mask)
+        if layout is None:
+            chosen = [field for i, field in enumerate(FIELDS) if mask & 1 << i]
+            layout = (struct.Struct("<" + "".join(fmt for _, fmt in chosen)),
+                      [name for name, _ in chosen])
+            self.layouts[mask] = layout
+        return layout
+
+    async def receive(self):
+        _, self.tick, mask = SNAPSHOT.unpack(await self.reader.readexactly(SNAPSHOT.size))
+        packer, names = self.layout(mask)
+        values = packer.unpack(await self.reader.readexactly(packer.size))
+        self.state.update(zip(names, values))
+        return self.state
+
+    def send_input(self, mask):
+        self.writer.write(INPUT.pack(MSG_INPUT, self.tick, mask))
+
+    def scoring(self):
+        return to_scoring(self.state["score"])
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+def chase_ball(client):
+    # Input mask for a loopback bot that follows the ball and swings when close
+    state = client.state
+    x = state[f"player{client.player}_x"]
+    y = state[f"player{client.player}_y"]
+    mask = 0
+    if state["ball_y"] < y:
+        mask |= UP
+    elif state["ball_y"] > y + 40:
+        mask |= DOWN
+    if abs(state["ball_x"] - x) < 50 and abs(state["ball_y"] - y - 20) < 50:
+        mask |= SWING
+    return mask
+
+async def run_loopback_bot(host, port, match_id, seconds):
+    client = LoopbackClient()
+    await client.connect(host, port, match_id)
+    loop = asyncio.get_running_loop()
+    end = loop.time() + seconds
+    try:
+        while loop.time() < end:
+            await asyncio.wait_for(client.receive(), max(end - loop.time(), 0.001))
+            client.send_input(chase_ball(client))
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await client.close()
+    return client
+
+async def load_test(matches, seconds, tick_rate=TICK_RATE):
+    # Server plus two loopback bots per match in this process
+    server = MatchServer(tick_rate=tick_rate)
+    await server.start()
+    bots = asyncio.gather(*(run_loopback_bot(server.host, server.port, match_id, seconds)
+                            for match_id in range(matches) for _ in range(2)), return_exceptions=True)
+    # Sampled while every bot is still connected
+    await asyncio.sleep(seconds * 0.9)
+    stats = server.stats()
+    results = await bots
+    await server.stop()
+    stats["client_errors"] = sum(isinstance(result, BaseException) for result in results)
+    return stats
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Authoritative multiplayer match server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--tick-rate", type=int, default=TICK_RATE)
+    parser.add_argument("--loopback", type=int, metavar="MATCHES",
+                        help="run this many bot matches over loopback and print server stats")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.loopback:
+        print(json.dumps(asyncio.run(load_test(args.loopback, args.seconds, args.tick_rate)), indent=2))
+    else:
+        async def serve():
+            server = MatchServer(args.host, args.port, args.tick_rate)
+            await server.start()
+            print(f"Serving on {server.host}:{server.port} at {server.tick_rate} ticks/s")
+            await server.server.serve_forever()
+
+        asyncio.run(serve())
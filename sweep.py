@@ -0,0 +1,312 @@
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from tennis_game import GameConfig, DEFAULT_CONFIG, TICK_RATE
+from headless import run_match
+from match_farm import MatchSummary
+
+# Range every tunable is searched over; these three stay whole numbers
+PARAMETERS = {
+    "player_speed": (2, 10),
+    "gravity": (0.0, 0.25),
+    "air_resistance": (0.99, 1.0),
+    "hit_spread_x": (0.0, 3.0),
+    "hit_spread_y": (0.0, 4.0),
+    "court_width": (500, 1100),
+    "court_height": (250, 700)
+}
+INTEGER_PARAMETERS = {"player_speed", "court_width", "court_height"}
+
+# Ten minutes of play per match is plenty for per-point metrics, and keeps
+# one configuration down to a few seconds of CPU
+SWEEP_TICKS = TICK_RATE * 60 * 10
+
+# What the auto-tuner aims for when no --target is given
+DEFAULT_TARGETS = {"avg_rally_length": 6.0, "points_per_minute": 4.0}
+
+CACHE_FILE = "sweep_cache.jsonl"
+
+def normalize(name, value):
+    # Rounded so the same configuration always hashes to the same cache key
+    if name in INTEGER_PARAMETERS:
+        return int(round(value))
+    return round(float(value), 6)
+
+def evaluate(values, matches, first_seed, max_ticks, difficulty):
+    # Runs inside a worker: AI-vs-AI matches on one configuration
+    config = GameConfig.from_dict(values)
+    summary = MatchSummary()
+    for seed in range(first_seed, first_seed + matches):
+        summary.add(run_match(seed, max_ticks, difficulty, config))
+    return metrics(summary)
+
+def metrics(summary):
+    points = max(summary.points, 1)
+    minutes = summary.ticks / TICK_RATE / 60
+    return {
+        "matches": summary.matches,
+        "unfinished": summary.unfinished,
+        "player1_wins": summary.wins[1],
+        "player2_wins": summary.wins[2],
+        "avg_rally_length": summary.hits / points,
+        "points_per_minute": summary.points / minutes if minutes else 0.0,
+        "avg_point_seconds": summary.ticks / TICK_RATE / points
+    }
+
+def loss(result, targets):
+    # Sum of squared relative misses, 0 when every target is hit exactly
+    return sum(((result[name] - target) / target) ** 2 for name, target in targets.items())
+
+class ResultCache:
+    # Finished configurations, one JSON line each, appended as they complete
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.results = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.results[entry["key"]] = entry["metrics"]
+
+    def get(self, key):
+        return self.results.get(key)
+
+    def put(self, key, values, result):
+        self.results[key] = result
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"key": key, "config": values, "metrics": result}) + "\n")
+
+class Sweep:
+    # Evaluates configurations over a process pool, skipping any whose
+    # metrics are already in the cache from an earlier run
+    def __init__(self, matches=8, max_ticks=SWEEP_TICKS, difficulty="medium", first_seed=0,
+                 workers=None, cache_path=CACHE_FILE):
+        self.matches = matches
+        self.max_ticks = max_ticks
+        self.difficulty = difficulty
+        self.first_seed = first_seed
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = ResultCache(cache_path)
+        self.evaluated = 0
+        self.cached = 0
+
+    def key(self, values):
+        settings = {"config": values, "matches": self.matches, "max_ticks": self.max_ticks,
+                    "difficulty": self.difficulty, "first_seed": self.first_seed}
+        return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+    def run(self, configs):
+        # (values, metrics) for every configuration, in the order given
+        results = [None] * len(configs)
+        todo = {}
+        for i, values in enumerate(configs):
+            key = self.key(values)
+            result = self.cache.get(key)
+            if result is not None:
+                results[i] = (values, result)
+                self.cached += 1
+            else:
+                todo.setdefault(key, []).append(i)
+        if not todo:
+            return results
+
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(todo))) as executor:
+            futures = {}
+            for key, indices in todo.items():
+                values = configs[indices[0]]
+                future = executor.submit(evaluate, values, self.matches, self.first_seed,
+                                         self.max_ticks, self.difficulty)
+                futures[future] = key
+            for future in as_completed(futures):
+                key = futures[future]
+                indices = todo[key]
+                result = future.result()
+                self.cache.put(key, configs[indices[0]], result)
+                self.evaluated += 1
+                for i in indices:
+                    results[i] = (configs[i], result)
+        return results
+
+def base_values(overrides=None):
+    values = {name: normalize(name, value) for name, value in DEFAULT_CONFIG.as_dict().items()}
+    for name, value in (overrides or {}).items():
+        values[name] = normalize(name, value)
+    return values
+
+def grid_configs(grid, base=None):
+    # Cartesian product of the listed values, everything else from base
+    names = list(grid)
+    configs = []
+    for combination in itertools.product(*(grid[name] for name in names)):
+        values = base_values(base)
+        for name, value in zip(names, combination):
+            values[name] = normalize(name, value)
+        configs.append(values)
+    return configs
+
+def random_config(names, rng, base=None):
+    values = base_values(base)
+    for name in names:
+        low, high = PARAMETERS[name]
+        values[name] = normalize(name, rng.uniform(low, high))
+    return values
+
+def random_configs(count, names, seed=0, base=None):
+    rng = random.Random(seed)
+    return [random_config(names, rng, base) for _ in range(count)]
+
+def to_unit(values, names):
+    # Point in the unit cube the Gaussian process works in
+    return [(values[name] - PARAMETERS[name][0]) / (PARAMETERS[name][1] - PARAMETERS[name][0])
+            for name in names]
+
+class GaussianProcess:
+    # Plain RBF-kernel regression, enough for the few dozen points a sweep has
+    def __init__(self, length_scale=0.25, noise=1e-4):
+        self.length_scale = length_scale
+        self.noise = noise
+
+    def kernel(self, a, b):
+        distances = ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=2)
+        return np.exp(-0.5 * distances / self.length_scale ** 2)
+
+    def fit(self, points, values):
+        self.points = np.asarray(points, dtype=float)
+        values = np.asarray(values, dtype=float)
+        self.mean = values.mean()
+        self.scale = values.std() or 1.0
+        covariance = self.kernel(self.points, self.points) + self.noise * np.eye(len(self.points))
+        self.cholesky = np.linalg.cholesky(covariance)
+        residuals = (values - self.mean) / self.scale
+        self.weights = np.linalg.solve(self.cholesky.T, np.linalg.solve(self.cholesky, residuals))
+
+    def predict(self, candidates):
+        cross = self.kernel(np.asarray(candidates, dtype=float), self.points)
+        mean = cross @ self.weights
+        v = np.linalg.solve(self.cholesky, cross.T)
+        variance = np.clip(1.0 - (v ** 2).sum(axis=0), 1e-12, None)
+        return mean * self.scale + self.mean, np.sqrt(variance) * self.scale
+
+def expected_improvement(mean, std, best):
+    # For minimization: how far below `best` each candidate is expected to land
+    z = (best - mean) / std
+    cdf = 0.5 * (1 + np.vectorize(math.erf)(z / math.sqrt(2)))
+    pdf = np.exp(-0.5 * z ** 2) / math.sqrt(2 * math.pi)
+    return (best - mean) * cdf + std * pdf
+
+def bayesian_search(sweep, count, names, targets, seed=0, initial=None, batch=None,
+                    base=None, candidates=2000):
+    # Random configurations first, then rounds of `batch` picks by expected
+    # improvement of log(1 + loss). Picks within a round assume the GP's own
+    # prediction for the earlier ones, which spreads them out.
+    rng = random.Random(seed)
+    initial = initial or max(4, count // 3)
+    batch = batch or sweep.workers
+    results = sweep.run([random_config(names, rng, base) for _ in range(min(initial, count))])
+
+    while len(results) < count:
+        points = [to_unit(values, names) for values, _ in results]
+        scores = [math.log1p(loss(result, targets)) for _, result in results]
+        pool = [random_config(names, rng, base) for _ in range(candidates)]
+        pool_points = np.array([to_unit(values, names) for values in pool])
+
+        picks = []
+        for _ in range(min(batch, count - len(results))):
+            gp = GaussianProcess()
+            gp.fit(points, scores)
+            mean, std = gp.predict(pool_points)
+            improvement = expected_improvement(mean, std, min(scores))
+            improvement[[i for i, _ in picks]] = -np.inf
+            best = int(np.argmax(improvement))
+            picks.append((best, pool[best]))
+            points.append(list(pool_points[best]))
+            scores.append(float(mean[best]))
+        results += sweep.run([values for _, values in picks])
+    return results
+
+def parse_assignment(text, multiple=False):
+    name, _, value = text.partition("=")
+    if name not in PARAMETERS:
+        raise ValueError(f"unknown parameter {name!r}, expected one of {', '.join(PARAMETERS)}")
+    if multiple:
+        return name, [float(item) for item in value.split(",")]
+    return name, float(value)
+
+def print_report(results, names, targets=None):
+    columns = list(names) + ["avg_rally_length", "points_per_minute", "avg_point_seconds"]
+    if targets:
+        columns.append("loss")
+        results = sorted(results, key=lambda item: loss(item[1], targets))
+    print("  ".join(f"{column:>17}" for column in columns))
+    for values, result in results:
+        row = [values[name] for name in names]
+        row += [result["avg_rally_length"], result["points_per_minute"], result["avg_point_seconds"]]
+        if targets:
+            row.append(loss(result, targets))
+        print("  ".join(f"{value:>17.6g}" for value in row))
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Sweep gameplay constants over AI-vs-AI matches")
+    parser.add_argument("mode", choices=("grid", "random", "bayes"))
+    parser.add_argument("--grid", action="append", default=[], metavar="NAME=V1,V2,...",
+                        help="values of one parameter for grid mode, repeatable")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="hold a parameter at a value instead of the default")
+    parser.add_argument("--params", default=",".join(PARAMETERS),
+                        help="parameters random and bayes modes vary")
+    parser.add_argument("--samples", type=int, default=32)
+    parser.add_argument("--target", action="append", default=[], metavar="METRIC=VALUE",
+                        help="metric the auto-tuner aims for, repeatable")
+    parser.add_argument("--matches", type=int, default=8, help="matches per configuration")
+    parser.add_argument("--ticks", type=int, default=SWEEP_TICKS, help="tick cap per match")
+    parser.add_argument("--ai", default="medium", choices=("easy", "medium", "hard"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache", default=CACHE_FILE, help="results cache, '' disables it")
+    parser.add_argument("--output", help="also write every result to this JSON file")
+    args = parser.parse_args()
+
+    base = dict(parse_assignment(item) for item in args.set)
+    targets = {}
+    for item in args.target:
+        metric, _, value = item.partition("=")
+        targets[metric] = float(value)
+
+    sweep = Sweep(args.matches, args.ticks, args.ai, args.seed, args.workers, args.cache)
+    start = time.perf_counter()
+    if args.mode == "grid":
+        grid = dict(parse_assignment(item, multiple=True) for item in args.grid)
+        if not grid:
+            parser.error("grid mode needs at least one --grid NAME=V1,V2,...")
+        names = list(grid)
+        results = sweep.run(grid_configs(grid, base))
+    else:
+        names = [name for name in args.params.split(",") if name]
+        for name in names:
+            if name not in PARAMETERS:
+                parser.error(f"unknown parameter {name!r}")
+        if args.mode == "random":
+            results = sweep.run(random_configs(args.samples, names, args.seed, base))
+        else:
+            targets = targets or DEFAULT_TARGETS
+            results = bayesian_search(sweep, args.samples, names, targets, args.seed, base=base)
+    elapsed = time.perf_counter() - start
+
+    print_report(results, names, targets)
+    print(f"{len(results)} configurations in {elapsed:.1f}s "
+          f"({sweep.evaluated} evaluated, {sweep.cached} from cache, {sweep.workers} workers)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([{"config": values, "metrics": result} for values, result in results], f, indent=2)
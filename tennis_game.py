@@ -1,16 +1,32 @@
+import time
+
+# Taken before anything else is imported, so the startup budget covers
+# importing pygame too
+START_TIME = time.perf_counter()
+
 import pygame
 import math
+import os
 import random
 import sys
+from collections import OrderedDict
 
-# Initialize Pygame
-pygame.init()
+from collision import CollisionWorld
+from events import Event, POINT, GAME, SET, MATCH, HIT
 
 # Constants
 SCREEN_WIDTH = 1200
 SCREEN_HEIGHT = 800
 FPS = 60
 
+# Simulation runs at a fixed rate, independent of how fast frames are drawn.
+# Ball and player speeds are tuned per tick at 60 ticks per second.
+TICK_RATE = 60
+MAX_CATCH_UP_TICKS = 5
+
+# Seconds from importing this module to the first menu frame on screen
+STARTUP_BUDGET = 0.5
+
 # Colors
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -29,8 +45,46 @@ COURT_HEIGHT = 400
 COURT_X = (SCREEN_WIDTH - COURT_WIDTH) // 2
 COURT_Y = (SCREEN_HEIGHT - COURT_HEIGHT) // 2
 
+class GameConfig:
+    # Gameplay constants a match is simulated with. The defaults are the
+    # original game; other values are for headless tuning (see sweep.py),
+    # the window always draws the default court.
+    FIELDS = ("player_speed", "gravity", "air_resistance", "hit_spread_x", "hit_spread_y",
+              "court_width", "court_height")
+    
+    def __init__(self, player_speed=5, gravity=0.1, air_resistance=0.999, hit_spread_x=1,
+                 hit_spread_y=2, court_width=COURT_WIDTH, court_height=COURT_HEIGHT):
+        self.player_speed = player_speed
+        self.gravity = gravity
+        self.air_resistance = air_resistance
+        # A hit adds uniform(-spread, spread) to the ball's dx and dy
+        self.hit_spread_x = hit_spread_x
+        self.hit_spread_y = hit_spread_y
+        self.court_width = court_width
+        self.court_height = court_height
+        
+        # Court centered on the screen like the default one
+        self.court_x = (SCREEN_WIDTH - court_width) // 2
+        self.court_y = (SCREEN_HEIGHT - court_height) // 2
+        self.court_right = self.court_x + court_width
+        self.court_bottom = self.court_y + court_height
+        self.center_x = self.court_x + court_width // 2
+        self.center_y = self.court_y + court_height // 2
+    
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+    
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**{name: values[name] for name in cls.FIELDS if name in values})
+
+DEFAULT_CONFIG = GameConfig()
+
 class TennisScoring:
-    def __init__(self):
+    def __init__(self, best_of=3):
+        # Sets needed to take the match: 2 of 3, or 3 of 5
+        self.best_of = best_of
+        self.sets_to_win = best_of // 2 + 1
         self.player1_games = 0
         self.player2_games = 0
         self.player1_sets = 0
@@ -41,6 +95,9 @@ class TennisScoring:
         self.advantage_player = None
         self.game_over = False
         self.winner = None
+        self.set_scores = []
+        # Called with (event kind, player) for every point, game, set and match won
+        self.listener = None
         
     def get_point_display(self, points):
         point_map = {0: "0", 1: "15", 2: "30", 3: "40"}
@@ -54,6 +111,8 @@ class TennisScoring:
             self.player1_points += 1
         else:
             self.player2_points += 1
+        if self.listener is not None:
+            self.listener(POINT, player)
             
         self.check_game_win()
     
@@ -64,13 +123,17 @@ class TennisScoring:
                 # Game won
                 if self.player1_points > self.player2_points:
                     self.player1_games += 1
+                    game_winner = 1
                 else:
                     self.player2_games += 1
+                    game_winner = 2
                 
                 self.player1_points = 0
                 self.player2_points = 0
                 self.is_deuce = False
                 self.advantage_player = None
+                if self.listener is not None:
+                    self.listener(GAME, game_winner)
                 
                 self.check_set_win()
             else:
@@ -91,19 +154,37 @@ class TennisScoring:
             
             if self.player1_games > self.player2_games:
                 self.player1_sets += 1
+                set_winner = 1
             else:
                 self.player2_sets += 1
+                set_winner = 2
                 
+            self.set_scores.append((self.player1_games, self.player2_games))
             self.player1_games = 0
             self.player2_games = 0
+            if self.listener is not None:
+                self.listener(SET, set_winner)
             
-            # Check match win (best of 3 sets)
-            if self.player1_sets >= 2:
+            # Check match win
+            if self.player1_sets >= self.sets_to_win:
                 self.game_over = True
                 self.winner = 1
-            elif self.player2_sets >= 2:
+            elif self.player2_sets >= self.sets_to_win:
                 self.game_over = True
                 self.winner = 2
+            if self.game_over and self.listener is not None:
+                self.listener(MATCH, self.winner)
+    
+    def get_state(self):
+        return (self.player1_games, self.player2_games, self.player1_sets, self.player2_sets,
+                self.player1_points, self.player2_points, self.is_deuce, self.advantage_player,
+                self.game_over, self.winner, tuple(self.set_scores))
+    
+    def set_state(self, state):
+        (self.player1_games, self.player2_games, self.player1_sets, self.player2_sets,
+         self.player1_points, self.player2_points, self.is_deuce, self.advantage_player,
+         self.game_over, self.winner, set_scores) = state
+        self.set_scores = list(set_scores)
     
     def get_score_display(self):
         if self.is_deuce:
@@ -116,97 +197,203 @@ class TennisScoring:
         else:
             return self.get_point_display(self.player1_points), self.get_point_display(self.player2_points)
 
+# Ball size and trail, with the trail circle radius and color of every slot
+# precomputed for each possible trail length
+BALL_RADIUS = 8
+TRAIL_LENGTH = 10
+TRAIL_RADII = [[int(BALL_RADIUS * i / n) for i in range(n)] for n in range(TRAIL_LENGTH + 1)]
+TRAIL_COLORS = [[(255, 255, 0, int(255 * i / n)) for i in range(n)] for n in range(TRAIL_LENGTH + 1)]
+
 class Ball:
-    def __init__(self, x, y):
+    # Fixed set of attributes and a preallocated ring buffer for the trail, so
+    # stepping the ball never creates garbage-collected objects
+    __slots__ = ("x", "y", "dx", "dy", "prev_x", "prev_y",
+                 "trail_x", "trail_y", "trail_head", "trail_len", "config")
+    
+    radius = BALL_RADIUS
+    
+    def __init__(self, x, y, rng=random, config=DEFAULT_CONFIG):
+        self.config = config
+        self.trail_x = [0] * TRAIL_LENGTH
+        self.trail_y = [0] * TRAIL_LENGTH
+        self.reset(x, y, rng)
+    
+    def reset(self, x, y, rng=random):
+        # Serve a fresh ball from (x, y), reusing this object
         self.x = x
         self.y = y
-        self.dx = random.choice([-3, 3])
-        self.dy = random.choice([-2, 2])
-        self.radius = 8
-        self.trail = []
+        self.dx = rng.choice([-3, 3])
+        self.dy = rng.choice([-2, 2])
+        self.prev_x = x
+        self.prev_y = y
+        self.trail_head = 0
+        self.trail_len = 0
         
     def update(self):
-        self.trail.append((self.x, self.y))
-        if len(self.trail) > 10:
-            self.trail.pop(0)
+        self.prev_x = self.x
+        self.prev_y = self.y
+        
+        # Trail positions are stored as the ints draw() needs
+        head = self.trail_head
+        self.trail_x[head] = int(self.x)
+        self.trail_y[head] = int(self.y)
+        self.trail_head = (head + 1) % TRAIL_LENGTH
+        if self.trail_len < TRAIL_LENGTH:
+            self.trail_len += 1
             
         self.x += self.dx
         self.y += self.dy
         
         # Ball physics - slight gravity and air resistance
-        self.dy += 0.1  # gravity
-        self.dx *= 0.999  # air resistance
+        config = self.config
+        self.dy += config.gravity
+        self.dx *= config.air_resistance
         
         # Court boundaries
-        if self.x <= COURT_X or self.x >= COURT_X + COURT_WIDTH:
+        if self.x <= config.court_x or self.x >= config.court_right:
             self.dx = -self.dx
             
         # Top and bottom court boundaries
-        if self.y <= COURT_Y:
+        if self.y <= config.court_y:
             self.dy = abs(self.dy)
-        elif self.y >= COURT_Y + COURT_HEIGHT:
+        elif self.y >= config.court_bottom:
             self.dy = -abs(self.dy)
     
-    def draw(self, screen):
-        # Draw trail
-        for i, pos in enumerate(self.trail):
-            alpha = i / len(self.trail)
-            radius = int(self.radius * alpha)
+    def get_state(self):
+        return (self.x, self.y, self.dx, self.dy, self.prev_x, self.prev_y,
+                tuple(self.trail_x), tuple(self.trail_y), self.trail_head, self.trail_len)
+    
+    def set_state(self, state):
+        (self.x, self.y, self.dx, self.dy, self.prev_x, self.prev_y,
+         trail_x, trail_y, self.trail_head, self.trail_len) = state
+        self.trail_x[:] = trail_x
+        self.trail_y[:] = trail_y
+    
+    @property
+    def trail(self):
+        # Trail positions from oldest to newest
+        start = self.trail_head - self.trail_len
+        return [(self.trail_x[i], self.trail_y[i]) for i in range(start, self.trail_head)]
+    
+    def get_draw_pos(self, alpha=1.0):
+        # Interpolated between the last two ticks, alpha=1 is the current tick
+        return (self.x - (self.x - self.prev_x) * (1 - alpha),
+                self.y - (self.y - self.prev_y) * (1 - alpha))
+    
+    def draw(self, screen, alpha=1.0):
+        x, y = self.get_draw_pos(alpha)
+        
+        # Draw trail, oldest first
+        count = self.trail_len
+        radii = TRAIL_RADII[count]
+        colors = TRAIL_COLORS[count]
+        start = self.trail_head - count
+        for i in range(count):
+            radius = radii[i]
             if radius > 0:
-                pygame.draw.circle(screen, (255, 255, 0, int(255 * alpha)), 
-                                 (int(pos[0]), int(pos[1])), radius)
+                pygame.draw.circle(screen, colors[i],
+                                   (self.trail_x[start + i], self.trail_y[start + i]), radius)
         
         # Draw ball
-        pygame.draw.circle(screen, YELLOW, (int(self.x), int(self.y)), self.radius)
-        pygame.draw.circle(screen, BLACK, (int(self.x), int(self.y)), self.radius, 2)
+        pygame.draw.circle(screen, YELLOW, (int(x), int(y)), self.radius)
+        pygame.draw.circle(screen, BLACK, (int(x), int(y)), self.radius, 2)
+    
+    def get_draw_rect(self, alpha=1.0):
+        # Area touched by draw(): the ball plus every trail circle
+        x, y = self.get_draw_pos(alpha)
+        left = right = int(x)
+        top = bottom = int(y)
+        start = self.trail_head - self.trail_len
+        for i in range(start, self.trail_head):
+            left = min(left, self.trail_x[i])
+            right = max(right, self.trail_x[i])
+            top = min(top, self.trail_y[i])
+            bottom = max(bottom, self.trail_y[i])
+        return pygame.Rect(left - self.radius, top - self.radius,
+                           right - left + self.radius * 2 + 1,
+                           bottom - top + self.radius * 2 + 1)
 
 class Player:
-    def __init__(self, x, y, color, is_player1=True):
+    def __init__(self, x, y, color, is_player1=True, config=DEFAULT_CONFIG):
         self.x = x
         self.y = y
         self.width = 20
         self.height = 40
         self.color = color
-        self.speed = 5
+        self.config = config
+        self.speed = config.player_speed
         self.is_player1 = is_player1
+        self.prev_x = x
+        self.prev_y = y
         
     def update(self, keys):
+        self.prev_x = self.x
+        self.prev_y = self.y
+        config = self.config
         if self.is_player1:
-            if keys[pygame.K_w] and self.y > COURT_Y:
+            if keys[pygame.K_w] and self.y > config.court_y:
                 self.y -= self.speed
-            if keys[pygame.K_s] and self.y < COURT_Y + COURT_HEIGHT - self.height:
+            if keys[pygame.K_s] and self.y < config.court_bottom - self.height:
                 self.y += self.speed
-            if keys[pygame.K_a] and self.x > COURT_X:
+            if keys[pygame.K_a] and self.x > config.court_x:
                 self.x -= self.speed
-            if keys[pygame.K_d] and self.x < COURT_X + COURT_WIDTH // 2 - self.width:
+            if keys[pygame.K_d] and self.x < config.center_x - self.width:
                 self.x += self.speed
         else:
-            if keys[pygame.K_UP] and self.y > COURT_Y:
+            if keys[pygame.K_UP] and self.y > config.court_y:
                 self.y -= self.speed
-            if keys[pygame.K_DOWN] and self.y < COURT_Y + COURT_HEIGHT - self.height:
+            if keys[pygame.K_DOWN] and self.y < config.court_bottom - self.height:
                 self.y += self.speed
-            if keys[pygame.K_LEFT] and self.x > COURT_X + COURT_WIDTH // 2:
+            if keys[pygame.K_LEFT] and self.x > config.center_x:
                 self.x -= self.speed
-            if keys[pygame.K_RIGHT] and self.x < COURT_X + COURT_WIDTH - self.width:
+            if keys[pygame.K_RIGHT] and self.x < config.court_right - self.width:
                 self.x += self.speed
     
-    def draw(self, screen):
+    def get_draw_pos(self, alpha=1.0):
+        # Interpolated between the last two ticks, alpha=1 is the current tick
+        return (int(self.x - (self.x - self.prev_x) * (1 - alpha)),
+                int(self.y - (self.y - self.prev_y) * (1 - alpha)))
+    
+    def draw(self, screen, alpha=1.0):
+        x, y = self.get_draw_pos(alpha)
+        
         # Draw player body
-        pygame.draw.rect(screen, self.color, (self.x, self.y, self.width, self.height))
+        pygame.draw.rect(screen, self.color, (x, y, self.width, self.height))
         
         # Draw head
         head_radius = 8
         pygame.draw.circle(screen, (255, 220, 177), 
-                         (self.x + self.width // 2, self.y - head_radius), head_radius)
+                         (x + self.width // 2, y - head_radius), head_radius)
         
         # Draw racket
-        racket_x = self.x + self.width + 5 if not self.is_player1 else self.x - 15
-        racket_y = self.y + self.height // 2
+        racket_x = x + self.width + 5 if not self.is_player1 else x - 15
+        racket_y = y + self.height // 2
         pygame.draw.rect(screen, (139, 69, 19), (racket_x, racket_y - 15, 10, 30))
         pygame.draw.circle(screen, BLACK, (racket_x + 5, racket_y - 20), 8, 2)
     
     def get_rect(self):
         return pygame.Rect(self.x, self.y, self.width, self.height)
+    
+    def get_racket_rect(self):
+        # Handle and head of the racket drawn by draw()
+        racket_x = self.x + self.width + 5 if not self.is_player1 else self.x - 15
+        racket_y = self.y + self.height // 2
+        return pygame.Rect(racket_x - 3, racket_y - 28, 16, 43)
+    
+    def get_state(self):
+        return (self.x, self.y, self.prev_x, self.prev_y)
+    
+    def set_state(self, state):
+        self.x, self.y, self.prev_x, self.prev_y = state
+    
+    def get_draw_rect(self, alpha=1.0):
+        # Area touched by draw(): body, head and racket
+        x, y = self.get_draw_pos(alpha)
+        head_radius = 8
+        racket_x = x + self.width + 5 if not self.is_player1 else x - 15
+        racket_y = y + self.height // 2
+        rect = pygame.Rect(x, y - head_radius * 2, self.width, self.height + head_radius * 2)
+        return rect.union(pygame.Rect(racket_x - 3, racket_y - 28, 17, 43))
 
 class MenuItem:
     def __init__(self, text, x, y, width, height, action=None):
@@ -233,26 +420,192 @@ class MenuItem:
         return (self.x <= pos[0] <= self.x + self.width and 
                 self.y <= pos[1] <= self.y + self.height)
 
+class TextCache:
+    # LRU cache of rendered text keyed by (font, text, color, antialias)
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        
+    def render(self, font, text, antialias, color):
+        key = (font, text, color, antialias)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = font.render(text, antialias, color)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.max_size:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+class CachedFont:
+    # Drop-in for pygame.font.Font whose render() goes through a TextCache.
+    # The font file is only loaded the first time something is rendered.
+    def __init__(self, size, cache):
+        self.size = size
+        self.font = None
+        self.cache = cache
+        
+    def render(self, text, antialias, color):
+        if self.font is None:
+            self.font = pygame.font.Font(None, self.size)
+        return self.cache.render(self.font, text, antialias, color)
+
+class TennisMatch:
+    # Simulation state of a single match, independent of any display
+    def __init__(self, seed=None, config=DEFAULT_CONFIG, best_of=3):
+        self.rng = random.Random(seed)
+        self.config = config
+        self.player1 = Player(config.court_x + 50, config.center_y, BLUE, True, config)
+        self.player2 = Player(config.court_right - 70, config.center_y, RED, False, config)
+        self.ball = Ball(config.center_x, config.center_y, self.rng, config)
+        # Cached rng.getstate(), cleared whenever the RNG is drawn from
+        self.rng_state = None
+        self.scoring = TennisScoring(best_of)
+        self.ticks = 0
+        self.hits = 0
+        self.collisions = CollisionWorld()
+        
+        # Optional input log, fed the keys and swings of every tick. Swings
+        # are counted by who swung: 1 player 1, 2 player 2, 3 both.
+        self.recorder = None
+        self.pending_swings = [0, 0, 0, 0]
+        
+        # Optional event sink (see events.py) and the match id its events carry
+        self.events = None
+        self.match_id = 0
+    
+    def set_event_sink(self, sink, match_id=0):
+        self.events = sink
+        self.match_id = match_id
+        self.scoring.listener = None if sink is None else self.emit_event
+    
+    def emit_event(self, kind, player):
+        ball = self.ball
+        scoring = self.scoring
+        self.events.write(Event(self.match_id, self.ticks, kind, player,
+                                ball.x, ball.y, ball.dx, ball.dy,
+                                self.player1.x, self.player1.y, self.player2.x, self.player2.y,
+                                scoring.player1_points, scoring.player2_points,
+                                scoring.player1_games, scoring.player2_games,
+                                scoring.player1_sets, scoring.player2_sets))
+    
+    def get_state(self):
+        # Everything needed to resume the match deterministically, RNG included.
+        # random.getstate() costs more than a whole tick, so it is only taken
+        # again after a hit or a serve has drawn from the RNG.
+        if self.rng_state is None:
+            self.rng_state = self.rng.getstate()
+        return (self.player1.get_state(), self.player2.get_state(), self.ball.get_state(),
+                self.scoring.get_state(), self.ticks, self.hits, self.rng_state)
+    
+    def set_state(self, state):
+        player1, player2, ball, scoring, self.ticks, self.hits, rng = state
+        self.player1.set_state(player1)
+        self.player2.set_state(player2)
+        self.ball.set_state(ball)
+        self.scoring.set_state(scoring)
+        if rng is not self.rng_state:
+            self.rng.setstate(rng)
+            self.rng_state = rng
+        self.pending_swings = [0, 0, 0, 0]
+    
+    def hit_ball(self, players=None):
+        # Swept test of the ball's last move against the swinging players'
+        # bodies and rackets; the shared SPACE key swings for both
+        if players is None:
+            players = (self.player1, self.player2)
+        self.pending_swings[(self.player1 in players) | (self.player2 in players) << 1] += 1
+        contact = self.collisions.contacts((self.ball,), players)[0]
+        if contact is None:
+            return None
+        
+        self.rng_state = None
+        spread_x = self.config.hit_spread_x
+        spread_y = self.config.hit_spread_y
+        if contact[1].owner is self.player1:
+            self.ball.dx = abs(self.ball.dx) + self.rng.uniform(-spread_x, spread_x)
+            self.ball.dy += self.rng.uniform(-spread_y, spread_y)
+            self.hits += 1
+            if self.events is not None:
+                self.emit_event(HIT, 1)
+            return 1
+        else:
+            self.ball.dx = -abs(self.ball.dx) + self.rng.uniform(-spread_x, spread_x)
+            self.ball.dy += self.rng.uniform(-spread_y, spread_y)
+            self.hits += 1
+            if self.events is not None:
+                self.emit_event(HIT, 2)
+            return 2
+    
+    def update(self, keys):
+        swings = self.pending_swings
+        if self.recorder is not None:
+            self.recorder.record(keys, swings)
+        if swings[1] or swings[2] or swings[3]:
+            swings[1] = swings[2] = swings[3] = 0
+        
+        self.player1.update(keys)
+        self.player2.update(keys)
+        self.ball.update()
+        self.ticks += 1
+        
+        # Check for scoring
+        config = self.config
+        if self.ball.x < config.court_x:
+            self.scoring.add_point(2)  # Player 2 scores
+            self.ball.reset(config.center_x, config.center_y, self.rng)
+            self.rng_state = None
+            return 2
+        elif self.ball.x > config.court_right:
+            self.scoring.add_point(1)  # Player 1 scores
+            self.ball.reset(config.center_x, config.center_y, self.rng)
+            self.rng_state = None
+            return 1
+        return None
+
 class TennisGame:
-    def __init__(self):
+    def __init__(self, dirty_rects=False, tick_rate=TICK_RATE, render_fps=FPS, record_dir=None,
+                 profiler=None, ai=None, event_sink=None):
+        # Only what the window needs; pygame.init() would also bring up audio,
+        # joysticks and the rest, which the game never uses
+        pygame.display.init()
+        pygame.font.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Professional Tennis Game")
         self.clock = pygame.time.Clock()
+        self.tick_rate = tick_rate
+        self.render_fps = render_fps  # 0 renders as fast as possible
         
-        # Fonts
-        self.title_font = pygame.font.Font(None, 72)
-        self.menu_font = pygame.font.Font(None, 48)
-        self.score_font = pygame.font.Font(None, 36)
-        self.small_font = pygame.font.Font(None, 24)
+        # Fonts, all sharing one cache of rendered strings and loaded on first use
+        self.text_cache = TextCache()
+        self.title_font = CachedFont(72, self.text_cache)
+        self.menu_font = CachedFont(48, self.text_cache)
+        self.score_font = CachedFont(36, self.text_cache)
+        self.small_font = CachedFont(24, self.text_cache)
         
         # Game states
         self.state = "MENU"  # MENU, PLAYING, PAUSED, GAME_OVER
         
         # Game objects
-        self.player1 = Player(COURT_X + 50, COURT_Y + COURT_HEIGHT // 2, BLUE)
-        self.player2 = Player(COURT_X + COURT_WIDTH - 70, COURT_Y + COURT_HEIGHT // 2, RED, False)
-        self.ball = Ball(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
-        self.scoring = TennisScoring()
+        self.match = TennisMatch()
+        
+        # When set, every match's inputs are saved there for replay.py
+        self.record_dir = record_dir
+        self.recording = None
+        
+        # Optional profiler.FrameProfiler, its overlay is toggled with F3
+        self.profiler = profiler
+        self.profiler_rect = None
+        
+        # Computer opponent difficulty for player 2 (see ai.py), None for two humans
+        self.ai = ai
+        self.ai_controller = None
+        self.ai_keys = None
+        
+        # Optional events.py sink fed every match's points and hits, closed on exit
+        self.event_sink = event_sink
+        self.games_started = 0
         
         # Menu items
         self.menu_items = [
@@ -263,6 +616,36 @@ class TennisGame:
         
         self.instructions_back = MenuItem("BACK", 50, SCREEN_HEIGHT - 100, 100, 50, "menu")
         
+        # Static backgrounds rendered once, keyed by name
+        self.layers = {}
+        
+        # Scoreboard is re-rendered only when the score it shows changes
+        self.score_key = None
+        self.score_surface = None
+        self.score_rect = pygame.Rect(10, 10, 300, 150)
+        
+        # Dirty-rect mode repaints only what moved while a rally is on screen
+        self.dirty_rects = dirty_rects
+        self.drawn_state = None
+        self.drawn_rects = []
+        
+        # Seconds from START_TIME until the first frame was shown
+        self.startup_time = None
+        
+    def get_layer(self, name, render):
+        # Rebuilt only when missing or when the display size has changed
+        size = self.screen.get_size()
+        layer = self.layers.get(name)
+        if layer is None or layer.get_size() != size:
+            layer = pygame.Surface(size)
+            render(layer)
+            # convert() drops surface alpha, so carry it over
+            alpha = layer.get_alpha()
+            layer = layer.convert()
+            layer.set_alpha(alpha)
+            self.layers[name] = layer
+        return layer
+    
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -278,19 +661,15 @@ class TennisGame:
                         self.state = "MENU"
                         
                 elif event.key == pygame.K_SPACE and self.state == "PLAYING":
-                    # Simple ball hitting mechanism
-                    player1_rect = self.player1.get_rect()
-                    player2_rect = self.player2.get_rect()
-                    ball_rect = pygame.Rect(self.ball.x - self.ball.radius, 
-                                          self.ball.y - self.ball.radius,
-                                          self.ball.radius * 2, self.ball.radius * 2)
+                    if self.ai_controller is not None:
+                        # Against the computer SPACE only swings player 1's racket
+                        self.match.hit_ball((self.match.player1,))
+                    else:
+                        self.match.hit_ball()
                     
-                    if player1_rect.colliderect(ball_rect):
-                        self.ball.dx = abs(self.ball.dx) + random.uniform(-1, 1)
-                        self.ball.dy += random.uniform(-2, 2)
-                    elif player2_rect.colliderect(ball_rect):
-                        self.ball.dx = -abs(self.ball.dx) + random.uniform(-1, 1)
-                        self.ball.dy += random.uniform(-2, 2)
+                elif event.key == pygame.K_F3 and self.profiler is not None:
+                    self.profiler.toggle_overlay()
+                    self.drawn_state = None  # repaint whatever the overlay covered
                         
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:  # Left click
@@ -326,41 +705,63 @@ class TennisGame:
         return True
     
     def start_new_game(self):
+        self.save_recording()
         self.state = "PLAYING"
-        self.player1 = Player(COURT_X + 50, COURT_Y + COURT_HEIGHT // 2, BLUE)
-        self.player2 = Player(COURT_X + COURT_WIDTH - 70, COURT_Y + COURT_HEIGHT // 2, RED, False)
-        self.ball = Ball(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
-        self.scoring = TennisScoring()
+        if self.record_dir:
+            from replay import MatchRecording
+            
+            seed = random.getrandbits(63)
+            self.match = TennisMatch(seed)
+            self.recording = MatchRecording(seed)
+            self.match.recorder = self.recording
+        else:
+            self.match = TennisMatch()
+        self.games_started += 1
+        if self.event_sink is not None:
+            self.match.set_event_sink(self.event_sink, self.games_started)
+        if self.ai:
+            from ai import AIController, AssistedKeys
+            
+            self.ai_controller = AIController(self.match.player2, random.Random(), self.ai)
+            self.ai_keys = AssistedKeys()
+    
+    def save_recording(self):
+        if self.recording is None or not self.recording.inputs:
+            return
+        os.makedirs(self.record_dir, exist_ok=True)
+        self.recording.save(os.path.join(self.record_dir, f"match-{self.recording.seed}.tnr"))
+        self.recording = None
     
     def update(self):
         if self.state == "PLAYING":
             keys = pygame.key.get_pressed()
-            
-            self.player1.update(keys)
-            self.player2.update(keys)
-            self.ball.update()
-            
-            # Check for scoring
-            if self.ball.x < COURT_X:
-                self.scoring.add_point(2)  # Player 2 scores
-                self.ball = Ball(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
-            elif self.ball.x > COURT_X + COURT_WIDTH:
-                self.scoring.add_point(1)  # Player 1 scores
-                self.ball = Ball(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)
+            if self.ai_controller is not None:
+                # The computer swings and presses player 2's keys like a human would
+                ball = self.match.ball
+                if self.ai_controller.wants_hit(ball):
+                    self.match.hit_ball((self.match.player2,))
+                self.ai_keys.base = keys
+                self.ai_keys.pressed.clear()
+                self.ai_controller.press(self.ai_keys, ball)
+                keys = self.ai_keys
+            self.match.update(keys)
                 
             # Check for game over
-            if self.scoring.game_over:
+            if self.match.scoring.game_over:
                 self.state = "GAME_OVER"
+                self.save_recording()
     
-    def draw_court(self):
+    def render_court_layer(self, surface):
+        surface.fill(DARK_GREEN)
+        
         # Court background
-        pygame.draw.rect(self.screen, GREEN, (COURT_X, COURT_Y, COURT_WIDTH, COURT_HEIGHT))
+        pygame.draw.rect(surface, GREEN, (COURT_X, COURT_Y, COURT_WIDTH, COURT_HEIGHT))
         
         # Court lines
-        pygame.draw.rect(self.screen, WHITE, (COURT_X, COURT_Y, COURT_WIDTH, COURT_HEIGHT), 3)
+        pygame.draw.rect(surface, WHITE, (COURT_X, COURT_Y, COURT_WIDTH, COURT_HEIGHT), 3)
         
         # Center line
-        pygame.draw.line(self.screen, WHITE, 
+        pygame.draw.line(surface, WHITE, 
                         (COURT_X + COURT_WIDTH // 2, COURT_Y),
                         (COURT_X + COURT_WIDTH // 2, COURT_Y + COURT_HEIGHT), 3)
         
@@ -368,82 +769,106 @@ class TennisGame:
         service_line_y1 = COURT_Y + COURT_HEIGHT // 4
         service_line_y2 = COURT_Y + 3 * COURT_HEIGHT // 4
         
-        pygame.draw.line(self.screen, WHITE,
+        pygame.draw.line(surface, WHITE,
                         (COURT_X, service_line_y1),
                         (COURT_X + COURT_WIDTH, service_line_y1), 2)
-        pygame.draw.line(self.screen, WHITE,
+        pygame.draw.line(surface, WHITE,
                         (COURT_X, service_line_y2),
                         (COURT_X + COURT_WIDTH, service_line_y2), 2)
         
         # Net
         net_x = COURT_X + COURT_WIDTH // 2
         for i in range(0, COURT_HEIGHT, 10):
-            pygame.draw.line(self.screen, WHITE,
+            pygame.draw.line(surface, WHITE,
                            (net_x - 2, COURT_Y + i),
                            (net_x + 2, COURT_Y + i), 1)
     
-    def draw_score(self):
-        if self.state != "PLAYING":
-            return
-            
+    def draw_court(self):
+        self.screen.blit(self.get_layer("court", self.render_court_layer), (0, 0))
+    
+    def render_score(self, scoring):
         # Score background
-        score_bg = pygame.Rect(10, 10, 300, 150)
-        pygame.draw.rect(self.screen, BLACK, score_bg)
-        pygame.draw.rect(self.screen, WHITE, score_bg, 2)
+        surface = pygame.Surface((300, 150))
+        surface.fill(BLACK)
+        pygame.draw.rect(surface, WHITE, surface.get_rect(), 2)
         
         # Current points
-        p1_points, p2_points = self.scoring.get_score_display()
+        p1_points, p2_points = scoring.get_score_display()
         
-        # Draw scores
-        y_offset = 20
+        # Draw scores, offsets are relative to the box at (10, 10)
+        y_offset = 10
         
         # Sets
-        sets_text = f"Sets: {self.scoring.player1_sets} - {self.scoring.player2_sets}"
+        sets_text = f"Sets: {scoring.player1_sets} - {scoring.player2_sets}"
         sets_surface = self.small_font.render(sets_text, True, WHITE)
-        self.screen.blit(sets_surface, (20, y_offset))
+        surface.blit(sets_surface, (10, y_offset))
         y_offset += 25
         
         # Games
-        games_text = f"Games: {self.scoring.player1_games} - {self.scoring.player2_games}"
+        games_text = f"Games: {scoring.player1_games} - {scoring.player2_games}"
         games_surface = self.small_font.render(games_text, True, WHITE)
-        self.screen.blit(games_surface, (20, y_offset))
+        surface.blit(games_surface, (10, y_offset))
         y_offset += 25
         
         # Points
         points_text = f"Points: {p1_points} - {p2_points}"
         points_surface = self.score_font.render(points_text, True, WHITE)
-        self.screen.blit(points_surface, (20, y_offset))
+        surface.blit(points_surface, (10, y_offset))
         y_offset += 35
         
         # Player names
         p1_text = self.small_font.render("Player 1 (WASD + Space)", True, BLUE)
         p2_text = self.small_font.render("Player 2 (Arrows + Space)", True, RED)
-        self.screen.blit(p1_text, (20, y_offset))
-        self.screen.blit(p2_text, (20, y_offset + 20))
+        surface.blit(p1_text, (10, y_offset))
+        surface.blit(p2_text, (10, y_offset + 20))
+        return surface.convert()
     
-    def draw_menu(self):
+    def update_score_surface(self):
+        scoring = self.match.scoring
+        score_key = (scoring.player1_sets, scoring.player2_sets,
+                     scoring.player1_games, scoring.player2_games,
+                     scoring.get_score_display())
+        if score_key == self.score_key:
+            return False
+        self.score_key = score_key
+        self.score_surface = self.render_score(scoring)
+        return True
+    
+    def draw_score(self):
+        if self.state != "PLAYING":
+            return
+            
+        self.update_score_surface()
+        self.screen.blit(self.score_surface, self.score_rect)
+    
+    def render_menu_layer(self, surface):
+        width, height = surface.get_size()
+        
         # Background gradient effect
-        for y in range(SCREEN_HEIGHT):
-            color_value = int(20 + (y / SCREEN_HEIGHT) * 40)
-            pygame.draw.line(self.screen, (0, color_value, 0), (0, y), (SCREEN_WIDTH, y))
+        for y in range(height):
+            color_value = int(20 + (y / height) * 40)
+            pygame.draw.line(surface, (0, color_value, 0), (0, y), (width, y))
         
         # Title
         title_surface = self.title_font.render("PROFESSIONAL TENNIS", True, WHITE)
-        title_rect = title_surface.get_rect(center=(SCREEN_WIDTH // 2, 150))
+        title_rect = title_surface.get_rect(center=(width // 2, 150))
         
         # Title shadow
         shadow_surface = self.title_font.render("PROFESSIONAL TENNIS", True, BLACK)
-        shadow_rect = shadow_surface.get_rect(center=(SCREEN_WIDTH // 2 + 3, 153))
-        self.screen.blit(shadow_surface, shadow_rect)
-        self.screen.blit(title_surface, title_rect)
+        shadow_rect = shadow_surface.get_rect(center=(width // 2 + 3, 153))
+        surface.blit(shadow_surface, shadow_rect)
+        surface.blit(title_surface, title_rect)
+        
+        # Version info
+        version_text = self.small_font.render("v1.0 - Professional Edition", True, WHITE)
+        surface.blit(version_text, (10, height - 30))
+    
+    def draw_menu(self):
+        self.screen.blit(self.get_layer("menu", self.render_menu_layer), (0, 0))
         
         # Menu items
         for item in self.menu_items:
             item.draw(self.screen, self.menu_font)
-        
-        # Version info
-        version_text = self.small_font.render("v1.0 - Professional Edition", True, WHITE)
-        self.screen.blit(version_text, (10, SCREEN_HEIGHT - 30))
     
     def draw_instructions(self):
         self.screen.fill((20, 40, 20))
@@ -487,21 +912,22 @@ class TennisGame:
         # Back button
         self.instructions_back.draw(self.screen, self.small_font)
     
-    def draw_game_over(self):
+    def render_overlay_layer(self, surface):
         # Semi-transparent overlay
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.set_alpha(128)
-        overlay.fill(BLACK)
-        self.screen.blit(overlay, (0, 0))
+        surface.set_alpha(128)
+        surface.fill(BLACK)
+    
+    def draw_game_over(self):
+        self.screen.blit(self.get_layer("overlay", self.render_overlay_layer), (0, 0))
         
         # Game over text
-        winner_text = f"PLAYER {self.scoring.winner} WINS!"
+        winner_text = f"PLAYER {self.match.scoring.winner} WINS!"
         winner_surface = self.title_font.render(winner_text, True, YELLOW)
         winner_rect = winner_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 50))
         self.screen.blit(winner_surface, winner_rect)
         
         # Final score
-        score_text = f"Final Score: {self.scoring.player1_sets} - {self.scoring.player2_sets}"
+        score_text = f"Final Score: {self.match.scoring.player1_sets} - {self.match.scoring.player2_sets}"
         score_surface = self.menu_font.render(score_text, True, WHITE)
         score_rect = score_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 20))
         self.screen.blit(score_surface, score_rect)
@@ -513,11 +939,7 @@ class TennisGame:
         self.screen.blit(continue_surface, continue_rect)
     
     def draw_paused(self):
-        # Semi-transparent overlay
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-        overlay.set_alpha(128)
-        overlay.fill(BLACK)
-        self.screen.blit(overlay, (0, 0))
+        self.screen.blit(self.get_layer("overlay", self.render_overlay_layer), (0, 0))
         
         # Paused text
         paused_surface = self.title_font.render("PAUSED", True, YELLOW)
@@ -530,9 +952,53 @@ class TennisGame:
         resume_rect = resume_surface.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 + 60))
         self.screen.blit(resume_surface, resume_rect)
     
-    def draw(self):
-        self.screen.fill(DARK_GREEN)
+    def get_sprite_rects(self, alpha=1.0):
+        return [self.match.player1.get_draw_rect(alpha),
+                self.match.player2.get_draw_rect(alpha),
+                self.match.ball.get_draw_rect(alpha)]
+    
+    def draw_dirty(self, alpha=1.0):
+        # Restore the court under last frame's sprites, draw them at their new
+        # positions and push only the union of old and new areas to the display
+        court = self.get_layer("court", self.render_court_layer)
+        restored = self.drawn_rects
+        if self.profiler is not None and self.profiler.overlay_visible and self.profiler_rect is not None:
+            # Last frame's overlay too, so sprites under it show through the new one
+            restored = restored + [self.profiler_rect]
+        for rect in restored:
+            self.screen.blit(court, rect, rect)
+        
+        self.match.player1.draw(self.screen, alpha)
+        self.match.player2.draw(self.screen, alpha)
+        self.match.ball.draw(self.screen, alpha)
         
+        sprite_rects = self.get_sprite_rects(alpha)
+        dirty = restored + sprite_rects
+        if self.update_score_surface() or self.score_rect.collidelist(dirty) != -1:
+            self.screen.blit(self.score_surface, self.score_rect)
+            dirty.append(self.score_rect)
+        
+        self.present(dirty)
+        self.drawn_rects = sprite_rects
+    
+    def present(self, rects=None):
+        if self.profiler is not None and self.profiler.overlay_visible:
+            self.profiler_rect = self.profiler.draw_overlay(self.screen)
+            if rects is not None:
+                rects.append(self.profiler_rect)
+        
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+    
+    def draw(self, alpha=1.0):
+        # alpha is how far the clock is between the last tick and the next one
+        if self.dirty_rects and self.state == "PLAYING" and self.drawn_state == "PLAYING":
+            self.draw_dirty(alpha)
+            return
+        
+        # Every state paints the full screen, so there is no clear here
         if self.state == "MENU":
             self.draw_menu()
             
@@ -542,9 +1008,9 @@ class TennisGame:
         elif self.state in ["PLAYING", "PAUSED", "GAME_OVER"]:
             # Draw game elements
             self.draw_court()
-            self.player1.draw(self.screen)
-            self.player2.draw(self.screen)
-            self.ball.draw(self.screen)
+            self.match.player1.draw(self.screen, alpha)
+            self.match.player2.draw(self.screen, alpha)
+            self.match.ball.draw(self.screen, alpha)
             self.draw_score()
             
             if self.state == "PAUSED":
@@ -552,19 +1018,92 @@ class TennisGame:
             elif self.state == "GAME_OVER":
                 self.draw_game_over()
         
-        pygame.display.flip()
+        self.present()
+        self.drawn_state = self.state
+        if self.dirty_rects and self.state == "PLAYING":
+            self.drawn_rects = self.get_sprite_rects(alpha)
+    
+    def check_startup(self):
+        self.startup_time = time.perf_counter() - START_TIME
+        if self.startup_time > STARTUP_BUDGET:
+            print(f"Startup took {self.startup_time * 1000:.0f}ms, over the "
+                  f"{STARTUP_BUDGET * 1000:.0f}ms budget", file=sys.stderr)
+        return self.startup_time <= STARTUP_BUDGET
     
     def run(self):
+        # Fixed-timestep loop: update() runs tick_rate times per second of real
+        # time whatever the frame rate, and frames interpolate between ticks
+        tick_time = 1.0 / self.tick_rate
+        accumulator = 0.0
+        previous = time.perf_counter()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.instrument(self)
         running = True
         while running:
+            if profiler is not None:
+                profiler.begin_frame()
+            now = time.perf_counter()
+            accumulator += now - previous
+            previous = now
+            
             running = self.handle_events()
-            self.update()
-            self.draw()
-            self.clock.tick(FPS)
+            
+            steps = 0
+            while accumulator >= tick_time and steps < MAX_CATCH_UP_TICKS:
+                self.update()
+                accumulator -= tick_time
+                steps += 1
+            if accumulator >= tick_time:
+                # Too far behind, drop the backlog instead of spiralling
+                accumulator %= tick_time
+            
+            # Nothing moves outside a rally, so draw the current state as is
+            alpha = accumulator / tick_time if self.state == "PLAYING" else 1.0
+            self.draw(alpha)
+            if self.startup_time is None:
+                self.check_startup()
+            if profiler is not None:
+                profiler.end_frame()
+            self.clock.tick(self.render_fps)
         
+        self.save_recording()
+        if self.event_sink is not None:
+            self.event_sink.close()
+        if profiler is not None:
+            profiler.export()
         pygame.quit()
         sys.exit()
 
 if __name__ == "__main__":
-    game = TennisGame()
+    render_fps = FPS
+    if "--fps" in sys.argv:
+        render_fps = int(sys.argv[sys.argv.index("--fps") + 1])
+    record_dir = None
+    if "--record" in sys.argv:
+        record_dir = sys.argv[sys.argv.index("--record") + 1]
+    profiler = None
+    if "--profile" in sys.argv:
+        from profiler import FrameProfiler
+        
+        profiler = FrameProfiler(sys.argv[sys.argv.index("--profile") + 1],
+                                 target_fps=render_fps or FPS)
+    ai = None
+    if "--ai" in sys.argv:
+        ai = sys.argv[sys.argv.index("--ai") + 1]
+    event_sink = None
+    if "--events" in sys.argv:
+        from events import ColumnarSink
+        
+        event_sink = ColumnarSink(sys.argv[sys.argv.index("--events") + 1])
+    game = TennisGame(dirty_rects="--dirty-rects" in sys.argv, render_fps=render_fps,
+                      record_dir=record_dir, profiler=profiler, ai=ai, event_sink=event_sink)
+    if "--startup-check" in sys.argv:
+        # Show the menu once, report how long that took and exit
+        game.handle_events()
+        game.draw()
+        within_budget = game.check_startup()
+        print(f"startup {game.startup_time * 1000:.1f}ms (budget {STARTUP_BUDGET * 1000:.0f}ms)")
+        pygame.quit()
+        sys.exit(0 if within_budget else 1)
     game.run()
\ No newline at end of file
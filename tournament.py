@@ -0,0 +1,246 @@
+import json
+import os
+import random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from headless import HeadlessMatch, MAX_TICKS
+
+MAX_ENTRANTS = 1024
+FORMATS = ("knockout", "round_robin")
+CHECKPOINT_VERSION = 1
+
+# Entrants play as headless bots; reaction is their BotController skill.
+# Their index in the entrant list is their seeding, 0 being the top seed.
+Entrant = namedtuple("Entrant", ["name", "reaction"])
+
+def make_entrants(count, seed=0):
+    # Reactions spread over a realistic range, strongest seeded first
+    rng = random.Random(f"entrants-{seed}")
+    reactions = sorted((round(rng.uniform(0.82, 0.97), 4) for _ in range(count)), reverse=True)
+    return [Entrant(f"Player {i + 1}", reaction) for i, reaction in enumerate(reactions)]
+
+def bracket_order(size):
+    # Seeds (0-based) in bracket slot order, so the top seeds can only meet
+    # in the late rounds: 0 v 7, 3 v 4, 1 v 6, 2 v 5 for eight
+    order = [0]
+    while len(order) < size:
+        total = len(order) * 2 - 1
+        order = [seed for first in order for seed in (first, total - first)]
+    return order
+
+def round_robin_schedule(count):
+    # Circle method: every entrant meets every other once over count - 1
+    # rounds (count rounds with a bye when the count is odd)
+    players = list(range(count))
+    if count % 2:
+        players.append(None)
+    rounds = []
+    for _ in range(len(players) - 1):
+        half = len(players) // 2
+        pairs = [(players[i], players[-1 - i]) for i in range(half)]
+        rounds.append([(min(a, b), max(a, b)) for a, b in pairs if a is not None and b is not None])
+        players.insert(1, players.pop())
+    return rounds
+
+def leader(scoring, player1, player2):
+    # Who is ahead in an unfinished match: sets, then games, then points,
+    # and the higher seed (lower entrant index) when level. After round one
+    # player 1 is just whoever came through the upper slot.
+    for first, second in ((scoring.player1_sets, scoring.player2_sets),
+                          (scoring.player1_games, scoring.player2_games),
+                          (scoring.player1_points, scoring.player2_points)):
+        if first != second:
+            return 1 if first > second else 2
+    return 1 if player1 < player2 else 2
+
+def play_match(task):
+    # Runs inside a worker: one headless match between two entrants, with
+    # only plain JSON-ready values going in and out
+    round_index, slot, player1, player2, reactions, seed, best_of, max_ticks = task
+    match = HeadlessMatch(seed, reactions, best_of=best_of)
+    result = match.run(max_ticks)
+    scoring = match.match.scoring
+    winner = scoring.winner or leader(scoring, player1, player2)
+    return {
+        "round": round_index,
+        "slot": slot,
+        "player1": player1,
+        "player2": player2,
+        "winner": player1 if winner == 1 else player2,
+        "sets": [result.player1_sets, result.player2_sets],
+        "set_scores": [list(games) for games in result.set_scores],
+        "finished": scoring.game_over,
+        "points": result.points,
+        "hits": result.hits,
+        "ticks": result.ticks
+    }
+
+class Tournament:
+    # Plays a whole tournament round by round. Every match of a round goes
+    # to the worker pool at once; after each round the results are written
+    # to the checkpoint, and a tournament built on an existing checkpoint
+    # carries on from the first round it doesn't have.
+    def __init__(self, entrants, format="knockout", best_of=3, seed=0, max_ticks=MAX_TICKS,
+                 checkpoint=None):
+        if not 2 <= len(entrants) <= MAX_ENTRANTS:
+            raise ValueError(f"a tournament needs 2 to {MAX_ENTRANTS} entrants, got {len(entrants)}")
+        if format not in FORMATS:
+            raise ValueError(f"unknown format {format!r}, expected one of {', '.join(FORMATS)}")
+        if best_of not in (3, 5):
+            raise ValueError(f"matches are best of 3 or 5, not {best_of}")
+        self.entrants = [Entrant(*entrant) for entrant in entrants]
+        self.format = format
+        self.best_of = best_of
+        self.seed = seed
+        self.max_ticks = max_ticks
+        self.checkpoint = checkpoint
+        self.rounds = []
+        if format == "round_robin":
+            self.schedule = round_robin_schedule(len(entrants))
+        if checkpoint and os.path.exists(checkpoint):
+            self.load()
+
+    def settings(self):
+        return {"format": self.format, "best_of": self.best_of, "seed": self.seed,
+                "max_ticks": self.max_ticks, "entrants": [list(entrant) for entrant in self.entrants]}
+
+    def load(self):
+        with open(self.checkpoint) as f:
+            state = json.load(f)
+        if state.get("version") != CHECKPOINT_VERSION or state["settings"] != self.settings():
+            raise ValueError(f"{self.checkpoint} is a checkpoint of a different tournament")
+        self.rounds = state["rounds"]
+
+    def save(self):
+        if not self.checkpoint:
+            return
+        # Written aside and renamed, so a crash mid-write keeps the last round
+        temp = self.checkpoint + ".tmp"
+        with open(temp, "w") as f:
+            json.dump({"version": CHECKPOINT_VERSION, "settings": self.settings(), "rounds": self.rounds}, f)
+        os.replace(temp, self.checkpoint)
+
+    def total_rounds(self):
+        if self.format == "round_robin":
+            return len(self.schedule)
+        return (len(self.entrants) - 1).bit_length()
+
+    @property
+    def finished(self):
+        return len(self.rounds) >= self.total_rounds()
+
+    def next_pairs(self):
+        # (slot, player1, player2) of every match in the next round; None
+        # stands for a bye in the first knockout round
+        if self.format == "round_robin":
+            return [(slot, a, b) for slot, (a, b) in enumerate(self.schedule[len(self.rounds)])]
+        if self.rounds:
+            alive = [record["winner"] for record in self.rounds[-1]]
+        else:
+            size = 1 << self.total_rounds()
+            alive = [seed if seed < len(self.entrants) else None for seed in bracket_order(size)]
+        return [(slot, alive[slot * 2], alive[slot * 2 + 1]) for slot in range(len(alive) // 2)]
+
+    def match_seed(self, round_index, slot):
+        # Fixed per match, so a resumed round plays out exactly as it would have
+        return (self.seed * MAX_ENTRANTS * 2 + round_index) * MAX_ENTRANTS + slot
+
+    def play_round(self, executor, workers):
+        round_index = len(self.rounds)
+        records = []
+        tasks = []
+        for slot, player1, player2 in self.next_pairs():
+            if player1 is None or player2 is None:
+                winner = player1 if player2 is None else player2
+                records.append({"round": round_index, "slot": slot, "player1": player1,
+                                "player2": player2, "winner": winner, "bye": True})
+                continue
+            reactions = (self.entrants[player1].reaction, self.entrants[player2].reaction)
+            tasks.append((round_index, slot, player1, player2, reactions,
+                          self.match_seed(round_index, slot), self.best_of, self.max_ticks))
+        chunk_size = max(1, len(tasks) // (workers * 4))
+        records += executor.map(play_match, tasks, chunksize=chunk_size)
+        records.sort(key=lambda record: record["slot"])
+        self.rounds.append(records)
+        self.save()
+        return records
+
+    def run(self, workers=None, progress=None):
+        workers = workers or os.cpu_count() or 1
+        if self.finished:
+            return
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while not self.finished:
+                records = self.play_round(executor, workers)
+                if progress is not None:
+                    progress(len(self.rounds), self.total_rounds(), records)
+
+    def standings(self):
+        # (entrant, wins, losses, set difference, game difference), best first.
+        # In a knockout, entrants who went further rank higher.
+        table = {i: [0, 0, 0, 0, 0] for i in range(len(self.entrants))}
+        for round_index, records in enumerate(self.rounds):
+            for record in records:
+                if record.get("bye"):
+                    if self.format == "knockout":
+                        table[record["winner"]][4] = round_index + 1
+                    continue
+                sets = record["sets"]
+                games = [sum(score[0] for score in record["set_scores"]),
+                         sum(score[1] for score in record["set_scores"])]
+                for side, player in enumerate((record["player1"], record["player2"])):
+                    row = table[player]
+                    won = record["winner"] == player
+                    row[0] += won
+                    row[1] += not won
+                    row[2] += sets[side] - sets[1 - side]
+                    row[3] += games[side] - games[1 - side]
+                    if self.format == "knockout" and won:
+                        row[4] = round_index + 1
+        order = sorted(table, key=lambda i: (-table[i][4], -table[i][0], -table[i][2], -table[i][3], i))
+        return [(self.entrants[i], *table[i][:4]) for i in order]
+
+    def champion(self):
+        if not self.finished:
+            return None
+        if self.format == "knockout":
+            return self.entrants[self.rounds[-1][0]["winner"]]
+        return self.standings()[0][0]
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Simulate a tournament of headless matches")
+    parser.add_argument("--entrants", type=int, default=32, help=f"2 to {MAX_ENTRANTS}")
+    parser.add_argument("--format", choices=FORMATS, default="knockout")
+    parser.add_argument("--best-of", type=int, choices=(3, 5), default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS,
+                        help="unfinished matches go to whoever is ahead")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--checkpoint", help="JSON file to save each round to and resume from")
+    parser.add_argument("--top", type=int, default=10, help="standings rows to print")
+    args = parser.parse_args()
+
+    tournament = Tournament(make_entrants(args.entrants, args.seed), args.format, args.best_of,
+                            args.seed, args.max_ticks, args.checkpoint)
+    if tournament.rounds:
+        print(f"Resuming after round {len(tournament.rounds)} of {tournament.total_rounds()}")
+    round_start = start = time.perf_counter()
+
+    def progress(done, total, records):
+        global round_start
+        played = sum(1 for record in records if not record.get("bye"))
+        now = time.perf_counter()
+        print(f"Round {done}/{total}: {played} matches in {now - round_start:.1f}s")
+        round_start = now
+
+    tournament.run(args.workers, progress)
+    elapsed = time.perf_counter() - start
+
+    print(f"{'entrant':>12} {'reaction':>8} {'won':>4} {'lost':>4} {'sets':>5} {'games':>6}")
+    for entrant, won, lost, sets, games in tournament.standings()[:args.top]:
+        print(f"{entrant.name:>12} {entrant.reaction:8.4f} {won:4d} {lost:4d} {sets:+5d} {games:+6d}")
+    print(f"Champion: {tournament.champion().name} ({elapsed:.1f}s)")
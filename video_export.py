@@ -0,0 +1,297 @@
+import math
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+import pygame
+
+from tennis_game import TennisGame, TICK_RATE
+from replay import MatchRecording, ReplayPlayer
+
+# Surfaces frames are drawn into; a slot is drawn again only once its
+# encoder has copied the last frame out, which bounds memory to the ring
+RING_SIZE = 8
+
+# zlib level of exported PNGs; past 1 frames shrink little and encode much slower
+PNG_LEVEL = 1
+
+# Ticks of play kept before and after each highlight rally
+LEAD_IN = 30
+LEAD_OUT = 60
+
+def png_rows(width, height):
+    # Scanline buffer of an unfiltered PNG (a 0 filter byte before every row)
+    # and the (height, width, 3) view of its pixels
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    return rows, rows[:, 1:].reshape(height, width, 3)
+
+def encode_png(rgb, level=PNG_LEVEL):
+    height, width, _ = rgb.shape
+    rows, pixels = png_rows(width, height)
+    pixels[...] = rgb
+    return encode_png_rows(rows, level)
+
+def encode_png_rows(rows, level=PNG_LEVEL):
+    # 8-bit RGB PNG, one zlib stream. zlib releases the GIL, so encoder
+    # threads really overlap.
+    height = rows.shape[0]
+    width = (rows.shape[1] - 1) // 3
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data +
+                struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) +
+            chunk(b"IDAT", zlib.compress(rows, level)) + chunk(b"IEND", b""))
+
+# Writers hand each encoder thread a frame buffer from new_frame(): the
+# storage write() takes, and the (height, width, 3) RGB view of it to fill
+
+class RawVideoWriter:
+    # rgb24 frames back to back, for ffmpeg -f rawvideo -pix_fmt rgb24
+    ordered = True
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+
+    def new_frame(self, width, height):
+        rgb = np.empty((height, width, 3), dtype=np.uint8)
+        return rgb, rgb
+
+    def write(self, index, rgb):
+        self.file.write(rgb)
+
+    def close(self):
+        self.file.close()
+
+class PNGSequenceWriter:
+    # One numbered PNG per frame; files are independent, so any number of
+    # encoder threads can write them out of order
+    ordered = False
+
+    def __init__(self, directory, level=PNG_LEVEL):
+        self.directory = directory
+        self.level = level
+        os.makedirs(directory, exist_ok=True)
+
+    def new_frame(self, width, height):
+        return png_rows(width, height)
+
+    def write(self, index, rows):
+        with open(os.path.join(self.directory, f"frame-{index:06d}.png"), "wb") as f:
+            f.write(encode_png_rows(rows, self.level))
+
+    def close(self):
+        pass
+
+class OffscreenGame(TennisGame):
+    # TennisGame drawing into whatever Surface is set as its screen, never
+    # to a window
+    def __init__(self):
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        super().__init__()
+        self.state = "PLAYING"
+
+    def present(self, rects=None):
+        pass
+
+class FrameEncoder:
+    # Hands rendered ring slots to writer threads. Each thread copies the
+    # frame out of the locked surface view into its own buffer, gives the
+    # slot back and then encodes, so drawing and encoding overlap.
+    def __init__(self, writer, surfaces, workers=None):
+        self.writer = writer
+        self.surfaces = surfaces
+        # Byte of each 32-bit pixel holding red, green and blue
+        if surfaces[0].get_bytesize() == 4:
+            offsets = [shift // 8 for shift in surfaces[0].get_shifts()[:3]]
+            if sys.byteorder == "big":
+                offsets = [3 - offset for offset in offsets]
+            self.channels = offsets
+        else:
+            self.channels = None
+        self.free = queue.Queue()
+        for slot in range(len(surfaces)):
+            self.free.put(slot)
+        self.frames = queue.Queue()
+        self.error = None
+        if writer.ordered:
+            workers = 1
+        self.threads = [threading.Thread(target=self.work, name=f"frame-encoder-{i}", daemon=True)
+                        for i in range(workers or os.cpu_count() or 1)]
+        for thread in self.threads:
+            thread.start()
+
+    def acquire(self):
+        # Blocks while every slot is still waiting to be encoded
+        if self.error is not None:
+            raise self.error
+        return self.free.get()
+
+    def submit(self, index, slot):
+        # Zero-copy view of the surface's pixels; the surface stays locked
+        # until the encoder has dropped the view
+        surface = self.surfaces[slot]
+        if self.channels is None:
+            view = pygame.surfarray.pixels3d(surface)
+        else:
+            view = pygame.surfarray.pixels2d(surface)
+        self.frames.put((index, slot, view))
+
+    def work(self):
+        storage = rgb = None
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            index, slot, view = item
+            item = None
+            if storage is None:
+                width, height = view.shape[:2]
+                storage, rgb = self.writer.new_frame(width, height)
+            if self.channels is None:
+                rgb[...] = view.transpose(1, 0, 2)
+            else:
+                # Transposed, a 32-bit view is plain row-major memory; three
+                # byte-plane copies beat a strided 3D copy several times over
+                pixels = view.T.view(np.uint8).reshape(rgb.shape[0], rgb.shape[1], 4)
+                for channel, offset in enumerate(self.channels):
+                    rgb[:, :, channel] = pixels[:, :, offset]
+                pixels = None
+            view = None
+            self.free.put(slot)
+            try:
+                self.writer.write(index, storage)
+            except Exception as e:
+                self.error = e
+
+    def close(self):
+        for _ in self.threads:
+            self.frames.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.writer.close()
+        if self.error is not None:
+            raise self.error
+
+class VideoExporter:
+    # Replays a recording and renders it at `fps` through TennisGame.draw.
+    # Frames between two ticks are interpolated the same way the live game
+    # does it.
+    def __init__(self, recording, writer, fps=TICK_RATE, ring_size=RING_SIZE, workers=None):
+        self.player = ReplayPlayer(recording)
+        self.fps = fps
+        self.game = OffscreenGame()
+        self.game.match = self.player.match
+        self.surfaces = [self.game.screen.copy() for _ in range(ring_size)]
+        self.encoder = FrameEncoder(writer, self.surfaces, workers)
+        self.frames = 0
+        self.render_time = 0.0
+
+    def render(self, alpha):
+        slot = self.encoder.acquire()
+        start = time.perf_counter()
+        game = self.game
+        game.screen = self.surfaces[slot]
+        if game.match.scoring.game_over:
+            game.state = "GAME_OVER"
+        game.draw(alpha)
+        self.render_time += time.perf_counter() - start
+        self.encoder.submit(self.frames, slot)
+        self.frames += 1
+
+    def export(self, start_tick, end_tick):
+        # Frames covering [start_tick, end_tick) of the recording
+        end_tick = min(end_tick, len(self.player.recording.inputs))
+        self.player.seek(start_tick)
+        count = int((end_tick - start_tick) * self.fps / TICK_RATE)
+        for frame in range(count):
+            t = start_tick + frame * TICK_RATE / self.fps
+            target = max(math.ceil(t), start_tick)
+            while self.player.tick < target:
+                self.player.step()
+            self.render(1.0 - (target - t))
+
+    def close(self):
+        self.encoder.close()
+
+def highlight_ranges(recording, count=3, lead_in=LEAD_IN, lead_out=LEAD_OUT):
+    # Tick ranges of the `count` longest rallies (most hits between two
+    # points), found by replaying the recording once with an event sink
+    from events import MemorySink, POINT, HIT
+
+    player = ReplayPlayer(recording)
+    sink = MemorySink()
+    player.match.set_event_sink(sink)
+    player.run()
+
+    rallies = []
+    start = 0
+    hits = 0
+    for event in sink.events:
+        if event.kind == HIT:
+            hits += 1
+        elif event.kind == POINT:
+            rallies.append((hits, start, event.tick))
+            start = event.tick
+            hits = 0
+    best = sorted(rallies, key=lambda rally: -rally[0])[:count]
+    last = len(recording.inputs)
+    padded = sorted((max(0, start - lead_in), min(last, end + lead_out)) for _, start, end in best)
+    # Back-to-back rallies overlap once padded; exported once as one range
+    ranges = []
+    for start, end in padded:
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+    return ranges
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Render a recorded match to video frames without a window")
+    parser.add_argument("recording")
+    parser.add_argument("output", help="PNG directory, or a .rgb/.raw file for raw rgb24 video")
+    parser.add_argument("--start", type=int, default=0, help="first tick")
+    parser.add_argument("--end", type=int, default=None, help="last tick (exclusive)")
+    parser.add_argument("--highlights", type=int, default=0, metavar="N",
+                        help="export only the N longest rallies")
+    parser.add_argument("--fps", type=int, default=TICK_RATE)
+    parser.add_argument("--workers", type=int, default=None, help="PNG encoder threads")
+    parser.add_argument("--level", type=int, default=PNG_LEVEL, help="PNG compression level, 0-9")
+    parser.add_argument("--ring", type=int, default=RING_SIZE, help="frames in flight")
+    args = parser.parse_args()
+
+    recording = MatchRecording.load(args.recording)
+    if os.path.splitext(args.output)[1] in (".rgb", ".raw"):
+        writer = RawVideoWriter(args.output)
+    else:
+        writer = PNGSequenceWriter(args.output, args.level)
+    if args.highlights:
+        ranges = highlight_ranges(recording, args.highlights)
+    else:
+        ranges = [(args.start, len(recording.inputs) if args.end is None else args.end)]
+
+    exporter = VideoExporter(recording, writer, args.fps, args.ring, args.workers)
+    start = time.perf_counter()
+    for first, last in ranges:
+        exporter.export(first, last)
+    exporter.close()
+    elapsed = time.perf_counter() - start
+
+    footage = exporter.frames / args.fps
+    print(f"{exporter.frames} frames ({footage:.1f}s of footage) in {elapsed:.1f}s, "
+          f"{footage / max(elapsed, 1e-9):.1f}x real time, "
+          f"{exporter.render_time / max(exporter.frames, 1) * 1000:.2f}ms/frame drawing")
+    if isinstance(writer, RawVideoWriter):
+        width, height = exporter.surfaces[0].get_size()
+        print(f"ffmpeg -f rawvideo -pix_fmt rgb24 -s {width}x{height} -r {args.fps} "
+              f"-i {args.output} {os.path.splitext(args.output)[0]}.mp4")